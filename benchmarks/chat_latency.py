@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end latency benchmark of the chat.
+
+Starts the local stub LLM server and drives, through Streamlit's AppTest:
+- `client`: WrappedClient alone (intent classification + streamed answer)
+- `chat`: the full `speak()` flow of pages/chat.py over scripted conversations
+
+and reports time to first token, total latency and upstream requests per turn
+at p50/p95. Uses a throwaway Milvus Lite database, so retrieval runs against
+an empty collection unless --milvus points to a populated one.
+
+Run from the repository root:
+    python -m benchmarks.chat_latency --ttft 0.2 --token-delay 0.02
+
+With --llm-cache record the LLM responses are saved, and a later run with
+--llm-cache replay serves them with their original timing.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.stub_server import StubServer, StubSettings
+
+
+CONVERSATIONS = [
+    [
+        "Hola, buenos días",
+        "¿Cuántos días de vacaciones me corresponden al año?",
+        "¿Me lo puedes explicar con más detalle?",
+    ],
+    [
+        "¿Qué tipos de contrato de trabajo existen?",
+        "¿y en el caso de los contratos temporales?",
+        "¿Quién ganó el último mundial de fútbol?",
+    ],
+    [
+        "¿A qué edad se puede jubilar una persona?",
+        "¿Cuántos días de vacaciones me corresponden al año?",
+        "Gracias",
+    ],
+]
+
+
+def bench_secrets(
+    base_url: str, milvus_path: str, llm_cache: Dict[str, Any]
+) -> Dict[str, Any]:
+    return {
+        "user": {"default_user": "bench", "default_password": ""},
+        "dbs": {
+            "milvus": milvus_path,
+            "sessions": os.path.join(os.path.dirname(milvus_path), "sessions_bench.db"),
+        },
+        "dirs": {
+            "project": {"law": "./jsons/anteproyecto/law", "intro": "./jsons/anteproyecto"},
+            "mappings": "./preprocessing/mappings",
+            "qa": "./questions-and-answers",
+        },
+        "llm": {"base_url": base_url, "model": "stub", "api_key": "stub", "cache_prompt": True},
+        "embedding": {"base_url": base_url, "model": "stub", "api_key": ""},
+        "traces": {"capacity": 1000, "sample_rate": 1.0},
+        "llm_cache": llm_cache,
+    }
+
+
+def upstream_requests(stats) -> int:
+    """Requests received by the stub server so far (an embedding batch is one request)."""
+    return sum(stats.values()) - stats["embedded_texts"]
+
+
+def client_script(turns: list, stats):
+    """AppTest script timing WrappedClient calls directly, `stats` being the stub server's counters."""
+    import time
+    import streamlit as st
+    from chatbot.client import load_client
+    from chatbot.history import TalkHistory
+
+    client = load_client()
+    results = []
+    for query in turns:
+        # Same count as upstream_requests(), which the script cannot import
+        requests = sum(stats.values()) - stats["embedded_texts"]
+        start = time.perf_counter()
+        client.query_classify_intent(TalkHistory.empty(), query)
+        first = None
+        for _ in client.query_simple(TalkHistory.empty(), query):
+            if first is None:
+                first = time.perf_counter()
+        end = time.perf_counter()
+        results.append({
+            "ttft_ms": ((first or end) - start) * 1000,
+            "total_ms": (end - start) * 1000,
+            "requests": sum(stats.values()) - stats["embedded_texts"] - requests,
+        })
+    st.session_state["bench-results"] = results
+
+
+def new_app(script, secrets: Dict[str, Any], **kwargs) -> AppTest:
+    if callable(script):
+        at = AppTest.from_function(script, default_timeout=300, kwargs=kwargs)
+    else:
+        at = AppTest.from_file(script, default_timeout=300)
+    for key, value in secrets.items():
+        at.secrets[key] = value
+    at.session_state["logged_in"] = True
+    at.session_state["username"] = "bench"
+    return at
+
+
+def run_client(secrets: Dict[str, Any], server: StubServer) -> List[Dict[str, float]]:
+    turns = [turn for conversation in CONVERSATIONS for turn in conversation]
+    at = new_app(client_script, secrets, turns=turns, stats=server.stats)
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return at.session_state["bench-results"]
+
+
+def run_chat(secrets: Dict[str, Any], server: StubServer) -> List[Dict[str, float]]:
+    results = []
+    for conversation in CONVERSATIONS:
+        at = new_app(os.path.abspath("pages/chat.py"), secrets)
+        at.run()
+
+        for query in conversation:
+            seen = len(at.session_state["ai-traces"])
+            requests = upstream_requests(server.stats)
+
+            start = time.time()
+            at.chat_input[0].set_value(query).run()
+            end = time.time()
+            if at.exception:
+                raise RuntimeError(at.exception[0].message)
+
+            traces = list(at.session_state["ai-traces"])[seen:]
+            streamed = [t for t in traces if t.ttft is not None]
+            first = streamed[-1].started_at + streamed[-1].ttft if streamed else end
+
+            results.append({
+                "ttft_ms": (first - start) * 1000,
+                "total_ms": (end - start) * 1000,
+                "requests": upstream_requests(server.stats) - requests,
+            })
+    return results
+
+
+def report(name: str, results: List[Dict[str, float]]):
+    print(f"{name} ({len(results)} turns)")
+    for metric in ("ttft_ms", "total_ms", "requests"):
+        values = np.array([r[metric] for r in results], dtype=float)
+        p50, p95 = np.percentile(values, [50, 95])
+        print(f"  {metric:<9} p50 {p50:9.1f}   p95 {p95:9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["client", "chat", "all"], default="all")
+    parser.add_argument("--ttft", type=float, default=StubSettings.ttft)
+    parser.add_argument("--token-delay", type=float, default=StubSettings.token_delay)
+    parser.add_argument("--prompt-token-delay", type=float, default=StubSettings.prompt_token_delay)
+    parser.add_argument("--embedding-delay", type=float, default=StubSettings.embedding_delay)
+    parser.add_argument("--answer-tokens", type=int, default=StubSettings.answer_tokens)
+    parser.add_argument("--milvus", default=None, help="Milvus Lite database (default: a temporary one)")
+    parser.add_argument("--llm-cache", choices=["off", "cache", "record", "replay"], default="off")
+    parser.add_argument("--llm-cache-path", default="./benchmarks/recordings")
+    args = parser.parse_args()
+
+    server = StubServer(settings=StubSettings(
+        ttft=args.ttft,
+        token_delay=args.token_delay,
+        prompt_token_delay=args.prompt_token_delay,
+        embedding_delay=args.embedding_delay,
+        answer_tokens=args.answer_tokens,
+    )).start()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        milvus = args.milvus or os.path.join(workdir, "milvus_bench.db")
+        secrets = bench_secrets(
+            server.base_url, milvus, {"mode": args.llm_cache, "path": args.llm_cache_path}
+        )
+        try:
+            if args.mode in ("client", "all"):
+                report("WrappedClient", run_client(secrets, server))
+            if args.mode in ("chat", "all"):
+                report("speak()", run_chat(secrets, server))
+        finally:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
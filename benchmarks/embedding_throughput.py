@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Throughput of concurrent query embeddings, one request per query versus the
+shared micro-batcher, against the local stub server.
+
+Run from the repository root:
+    python -m benchmarks.embedding_throughput --sessions 32 --queries 10
+"""
+
+import argparse
+import threading
+import time
+from typing import Callable, List
+
+from openai import OpenAI
+
+from benchmarks.stub_server import StubServer, StubSettings
+from db.embedding_batcher import EmbeddingBatcher
+
+
+def run(embed: Callable[[str], List[float]], sessions: int, queries: int) -> float:
+    """Queries per second when `sessions` threads embed `queries` texts each."""
+    def session(i: int):
+        for j in range(queries):
+            embed(f"consulta {i}-{j} sobre el código de trabajo")
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sessions * queries / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=32)
+    parser.add_argument("--queries", type=int, default=10)
+    parser.add_argument("--embedding-delay", type=float, default=0.02, help="Stub seconds per request")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=8)
+    args = parser.parse_args()
+
+    server = StubServer(settings=StubSettings(embedding_delay=args.embedding_delay)).start()
+    # The stub serves requests one at a time, like a single embedding worker
+    lock = threading.Lock()
+    client = OpenAI(base_url=server.base_url, api_key="stub")
+
+    def embed_batch(texts: List[str]) -> List[List[float]]:
+        with lock:
+            response = client.embeddings.create(model="stub", input=texts)
+        return [data.embedding for data in response.data]
+
+    try:
+        single = run(lambda text: embed_batch([text])[0], args.sessions, args.queries)
+        print(f"one request per query: {single:8.1f} queries/s")
+
+        batcher = EmbeddingBatcher(embed_batch, max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000)
+        batched = run(batcher.embed, args.sessions, args.queries)
+        print(f"micro-batched:         {batched:8.1f} queries/s ({batched / single:.1f}x)")
+        print(f"batches: {batcher.stats()}")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
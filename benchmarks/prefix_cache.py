@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the prompt evaluation time of the chat requests, comparing the
+previous message layout with the prefix-cache friendly one.
+
+The legacy layout put the user query inside the classifier system prompt and
+the query before the retrieved context. The current layout keeps the system
+prompt, shots and history byte-identical and sends the per-turn material last,
+with `cache_prompt` so llama.cpp-like servers reuse the KV cache of the prefix.
+
+Every layout is measured with and without `cache_prompt`, so the effect of the
+layout is not mixed up with the effect of the flag. Each pass starts its
+questions with its own number, so no question is ever sent twice and cache
+hits can only come from the prefix before it. The cached variant of a layout
+runs first, so its first pass starts with a cold cache for that prefix (but
+for what it shares with the layouts measured before); later passes show the
+steady state.
+
+Run from the repository root:
+    python -m benchmarks.prefix_cache --base-url http://10.6.125.217:8080/v1 --model qwen/qwen3-14b
+
+or offline, against the stub server (which simulates the prefix cache):
+    python -m benchmarks.stub_server --ttft 0 --prompt-token-delay 0.0005 &
+    python -m benchmarks.prefix_cache --base-url http://127.0.0.1:8089/v1
+"""
+
+import argparse
+import itertools
+import json
+import os
+import statistics
+import time
+from typing import Dict, List, Optional
+
+from openai import OpenAI
+
+from chatbot.models import intents
+from chatbot.prompting import (
+    BASE_PROMPT,
+    INTENT_SHOTS,
+    build_intent_classifier_prompt,
+    build_rag_chat_system_prompt,
+    build_rag_chat_user_prompt,
+)
+
+
+QUESTIONS = [
+    "¿Cuántos días de vacaciones me corresponden al año?",
+    "¿Qué tipos de contrato de trabajo existen?",
+    "¿A qué edad se puede jubilar una persona?",
+    "¿Cuál es la duración de la jornada de trabajo?",
+    "¿Qué pasa si el empleador no paga el salario a tiempo?",
+    "¿Pueden trabajar los adolescentes?",
+    "¿Cómo se reclama ante una medida disciplinaria?",
+    "¿Qué derechos tiene una trabajadora embarazada?",
+]
+
+# Articles used as retrieved context for each question of the conversation
+CONTEXT_ARTICLES = ["104", "53", "8", "112", "130", "66", "176", "148"]
+
+
+def legacy_intent_prompt(q: str) -> str:
+    return f"""{BASE_PROMPT}
+Un usuario nos escribió con la siguiente consulta:
+
+{q}
+
+Tu tarea es clasificar esta consulta. Debes responder únicamente con un json con dos campos: `reasoning` con el razonamiento que permite conocer que tipo de consulta es; y `classification` donde estableces la categoría correcta de esta.
+Las posibles categorías son:
+{''.join([f'- {key}: {value}\n' for key,value in intents.INTENTS.items()])}
+"""
+
+
+def load_contexts(law_path: str) -> List[str]:
+    with open(os.path.join(law_path, "articles.json"), "r", encoding="utf-8") as f:
+        articles = json.load(f)
+    with open(os.path.join(law_path, "paragraphs.json"), "r", encoding="utf-8") as f:
+        paragraphs = json.load(f)
+
+    contexts = []
+    for article_id in CONTEXT_ARTICLES:
+        article = articles.get(article_id, {"begin": 0, "end": -1})
+        lines = [
+            paragraphs.get(str(i), "")
+            for i in range(article["begin"], article["end"] + 1)
+        ]
+        contexts.append(f"[Artículo {article_id}]\n" + "\n".join(lines))
+    return contexts
+
+
+def eval_prompt(
+    client: OpenAI, model: str, messages: List[Dict[str, str]], cache_prompt: bool
+) -> Dict[str, Optional[float]]:
+    """Send a request that generates a single token and time its prompt evaluation."""
+    start = time.perf_counter()
+    response = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        max_tokens=1,
+        temperature=0,
+        extra_body={"cache_prompt": cache_prompt},
+    )
+    wall = (time.perf_counter() - start) * 1000
+
+    # llama.cpp reports its own prompt evaluation time
+    timings = getattr(response, "timings", None) or {}
+    tokens = response.usage.prompt_tokens if response.usage else None
+    return {"wall_ms": wall, "prompt_ms": timings.get("prompt_ms"), "prompt_tokens": tokens}
+
+
+def classification_messages(q: str, legacy: bool) -> List[Dict[str, str]]:
+    if legacy:
+        return [{"role": "system", "content": legacy_intent_prompt(q)}]
+
+    messages = [{"role": "system", "content": build_intent_classifier_prompt()}]
+    for shot_q, shot_a in INTENT_SHOTS:
+        messages.append({"role": "user", "content": shot_q})
+        messages.append({"role": "assistant", "content": shot_a})
+    messages.append({"role": "user", "content": q})
+    return messages
+
+
+def conversation_messages(
+    history: List[Dict[str, str]], q: str, context: str, legacy: bool
+) -> List[Dict[str, str]]:
+    if legacy:
+        user = f"{q}\n\n====\n\n{context}"
+    else:
+        user = build_rag_chat_user_prompt(q, context)
+    return (
+        [{"role": "system", "content": build_rag_chat_system_prompt()}]
+        + history
+        + [{"role": "user", "content": user}]
+    )
+
+
+def run_layout(
+    client: OpenAI,
+    model: str,
+    contexts: List[str],
+    legacy: bool,
+    cache_prompt: bool,
+    tag: int,
+) -> Dict[str, List[Dict[str, Optional[float]]]]:
+    results = {"classification": [], "conversation": []}
+    # The tag makes every question of the pass new to the server, the prefix stays the same
+    questions = [f"Consulta {tag}: {q}" for q in QUESTIONS]
+
+    for q in questions:
+        results["classification"].append(
+            eval_prompt(client, model, classification_messages(q, legacy), cache_prompt)
+        )
+
+    history = []
+    for q, context in zip(questions, contexts):
+        results["conversation"].append(
+            eval_prompt(
+                client, model, conversation_messages(history, q, context, legacy), cache_prompt
+            )
+        )
+        # Past turns keep only the user query and a (fixed) answer, like the chat does
+        history = history + [
+            {"role": "user", "content": q},
+            {"role": "assistant", "content": "Según el anteproyecto, " + q.lower()},
+        ]
+
+    return results
+
+
+def summarize(name: str, samples: List[Dict[str, Optional[float]]]):
+    walls = [s["wall_ms"] for s in samples]
+    prompts = [s["prompt_ms"] for s in samples if s["prompt_ms"] is not None]
+    tokens = [s["prompt_tokens"] for s in samples if s["prompt_tokens"] is not None]
+    line = f"  {name:<15} wall p50 {statistics.median(walls):8.1f} ms"
+    if tokens:
+        line += f" | prompt tokens p50 {statistics.median(tokens):6.0f}"
+    if prompts:
+        line += f" | prompt eval p50 {statistics.median(prompts):8.1f} ms, total {sum(prompts):9.1f} ms"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=os.getenv("OPENAI_BASE_URL", "http://localhost:8080/v1"))
+    parser.add_argument("--model", default=os.getenv("OPENAI_MODEL", "qwen/qwen3-14b"))
+    parser.add_argument("--law-path", default="./jsons/anteproyecto/law")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes per layout (the first one is cold)")
+    args = parser.parse_args()
+
+    client = OpenAI(base_url=args.base_url, api_key=os.getenv("OPENAI_KEY", ""))
+    contexts = load_contexts(args.law_path)
+
+    layouts = [
+        ("legacy+cache", True, True),
+        ("legacy", True, False),
+        ("prefix+cache", False, True),
+        ("prefix", False, False),
+    ]
+    tags = itertools.count(1)
+    for name, legacy, cache_prompt in layouts:
+        passes = [
+            run_layout(client, args.model, contexts, legacy, cache_prompt, next(tags))
+            for _ in range(args.repeat)
+        ]
+        print(f"{name}, cold pass:")
+        summarize("classification", passes[0]["classification"])
+        summarize("conversation", passes[0]["conversation"])
+        if len(passes) > 1:
+            print(f"{name}, warm passes 2-{len(passes)}:")
+            for kind in ("classification", "conversation"):
+                summarize(kind, [sample for results in passes[1:] for sample in results[kind]])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Local stub of the OpenAI-compatible LLM server used by the benchmarks.
+
+Serves chat completions (plain, streamed and structured/parse requests) and
+embeddings with configurable delays, so the chat pipeline can be measured
+without network access. It also simulates a prompt prefix cache: prompt
+evaluation costs `prompt_token_delay` per token not shared with a previous
+prompt when the request asks for `cache_prompt`.
+
+Standalone usage (from the repository root):
+    python -m benchmarks.stub_server --port 8089 --ttft 0.2 --token-delay 0.02
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+import numpy as np
+
+
+@dataclass
+class StubSettings:
+    ttft: float = 0.2  # Seconds before the first token, besides prompt evaluation
+    token_delay: float = 0.02  # Seconds between generated tokens
+    prompt_token_delay: float = 0.0  # Seconds per evaluated (non cached) prompt token
+    embedding_delay: float = 0.01  # Seconds per embeddings request
+    answer_tokens: int = 60  # Tokens of every generated answer
+    embedding_dim: int = 768
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def classify(query: str) -> str:
+    """Intent the stub answers for a query, based on a few keywords."""
+    q = query.lower()
+    if any(w in q for w in ("fútbol", "película", "sentido de la vida", "receta")):
+        return "not_related"
+    if any(w in q for w in ("hola", "gracias", "explica", "detalle", "buenos días")):
+        return "neutral"
+    return "law"
+
+
+def embed(text: str, dim: int) -> List[float]:
+    """Deterministic unit vector for a text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class StubServer:
+    """OpenAI-compatible stub running in a background thread."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, settings: StubSettings = None):
+        self.settings = settings or StubSettings()
+        self.stats: Counter = Counter()
+        self._prompts: deque = deque(maxlen=64)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def prompt_eval_time(self, prompt: str, cache_prompt: bool) -> float:
+        """Simulated prompt evaluation time, skipping the longest cached prefix."""
+        cached = 0
+        with self._lock:
+            if cache_prompt:
+                for previous in self._prompts:
+                    common = 0
+                    for a, b in zip(previous, prompt):
+                        if a != b:
+                            break
+                        common += 1
+                    cached = max(cached, common)
+            self._prompts.append(prompt)
+        evaluated = estimate_tokens(prompt[cached:])
+        return evaluated * self.settings.prompt_token_delay
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, payload: Dict[str, Any]):
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.endswith("/stats"):
+                    self._send_json(dict(server.stats))
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+
+                if self.path.endswith("/embeddings"):
+                    self._embeddings(request)
+                elif self.path.endswith("/chat/completions"):
+                    self._chat(request)
+                else:
+                    self.send_error(404)
+
+            def _embeddings(self, request: Dict[str, Any]):
+                inputs = request.get("input", [])
+                if isinstance(inputs, str):
+                    inputs = [inputs]
+                server.stats["embeddings"] += 1
+                server.stats["embedded_texts"] += len(inputs)
+                time.sleep(server.settings.embedding_delay)
+
+                self._send_json({
+                    "object": "list",
+                    "model": request.get("model", "stub"),
+                    "data": [
+                        {"object": "embedding", "index": i, "embedding": embed(text, server.settings.embedding_dim)}
+                        for i, text in enumerate(inputs)
+                    ],
+                    "usage": {"prompt_tokens": 0, "total_tokens": 0},
+                })
+
+            def _chat(self, request: Dict[str, Any]):
+                settings = server.settings
+                messages = request.get("messages", [])
+                prompt = "".join(f"<{m.get('role')}>{m.get('content')}" for m in messages)
+                last_user = next(
+                    (m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), ""
+                )
+
+                prompt_eval = server.prompt_eval_time(prompt, bool(request.get("cache_prompt")))
+                timings = {
+                    "prompt_n": estimate_tokens(prompt),
+                    "prompt_ms": prompt_eval * 1000,
+                }
+
+                if request.get("response_format"):
+                    server.stats["parse"] += 1
+                    content = json.dumps({
+                        "reasoning": "Clasificación del servidor de prueba.",
+                        "classification": classify(last_user),
+                    })
+                    tokens = [content]
+                else:
+                    server.stats["chat"] += 1
+                    tokens = [f"palabra{i} " for i in range(settings.answer_tokens)]
+                    if request.get("max_tokens") is not None and request["max_tokens"] > 0:
+                        tokens = tokens[: request["max_tokens"]]
+
+                time.sleep(prompt_eval + settings.ttft)
+
+                if not request.get("stream"):
+                    time.sleep(settings.token_delay * max(len(tokens) - 1, 0))
+                    self._send_json({
+                        "id": "stub",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": request.get("model", "stub"),
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": "".join(tokens)},
+                            "finish_reason": "stop",
+                        }],
+                        "usage": {"prompt_tokens": timings["prompt_n"], "completion_tokens": len(tokens),
+                                  "total_tokens": timings["prompt_n"] + len(tokens)},
+                        "timings": timings,
+                    })
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for i, token in enumerate(tokens):
+                    if i:
+                        time.sleep(settings.token_delay)
+                    chunk = {
+                        "id": "stub",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": request.get("model", "stub"),
+                        "choices": [{
+                            "index": 0,
+                            "delta": {"role": "assistant", "content": token} if i == 0 else {"content": token},
+                            "finish_reason": None,
+                        }],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--ttft", type=float, default=StubSettings.ttft)
+    parser.add_argument("--token-delay", type=float, default=StubSettings.token_delay)
+    parser.add_argument("--prompt-token-delay", type=float, default=StubSettings.prompt_token_delay)
+    parser.add_argument("--embedding-delay", type=float, default=StubSettings.embedding_delay)
+    parser.add_argument("--answer-tokens", type=int, default=StubSettings.answer_tokens)
+    args = parser.parse_args()
+
+    server = StubServer(args.host, args.port, StubSettings(
+        ttft=args.ttft,
+        token_delay=args.token_delay,
+        prompt_token_delay=args.prompt_token_delay,
+        embedding_delay=args.embedding_delay,
+        answer_tokens=args.answer_tokens,
+    ))
+    print(f"Stub LLM server listening on {server.base_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
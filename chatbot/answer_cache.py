@@ -0,0 +1,177 @@
+"""
+Process-wide semantic cache of answers to questions about the law.
+A question is answered from the cache when its embedding is close enough to a
+previously answered one, the retrieved context is the same and so is the
+conversation it was asked in (its scope, e.g. a hash of the history).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import streamlit as st
+
+from chatbot.history import TalkHistory
+from chatbot.singleflight import request_key
+
+
+@dataclass
+class CachedAnswer:
+    vector: np.ndarray
+    context_ids: tuple
+    scope: str
+    answer: str
+    created_at: float
+
+
+def history_scope(history: TalkHistory) -> str:
+    """Scope of the answers given after a history: empty for a first question."""
+    if len(history) == 0:
+        return ""
+    return request_key("history", history.to_openai())
+
+
+class SemanticAnswerCache:
+    """LRU + TTL cache keyed on normalized query embeddings."""
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        capacity: int = 256,
+        ttl: float = 3600.0,
+    ):
+        """
+        Args:
+            threshold: Minimum cosine similarity between questions to reuse an answer
+            capacity: Maximum number of answers kept (least recently used are evicted)
+            ttl: Seconds an answer stays valid
+        """
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl = ttl
+        self.version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> Optional[np.ndarray]:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        # Zero vectors are the fallback used when the embedding service is down
+        if norm == 0:
+            return None
+        return vector / norm
+
+    def _sync_version(self, version: str):
+        if version != self.version:
+            self._entries.clear()
+            self.version = version
+
+    def _evict_expired(self, now: float):
+        expired = [k for k, e in self._entries.items() if now - e.created_at > self.ttl]
+        for key in expired:
+            del self._entries[key]
+
+    def lookup(
+        self,
+        embedding: Sequence[float],
+        context_ids: List[str],
+        version: str,
+        scope: str = "",
+    ) -> Optional[str]:
+        """Return a cached answer for a similar question with the same context and scope, if any."""
+        vector = self._normalize(embedding)
+        context_ids = tuple(context_ids)
+
+        with self._lock:
+            self._sync_version(version)
+            self._evict_expired(time.time())
+
+            candidates = [
+                (key, entry)
+                for key, entry in self._entries.items()
+                if entry.context_ids == context_ids and entry.scope == scope
+            ]
+            if vector is not None and candidates:
+                matrix = np.stack([entry.vector for _, entry in candidates])
+                scores = matrix @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.answer
+
+            self.misses += 1
+            return None
+
+    def store(
+        self,
+        embedding: Sequence[float],
+        context_ids: List[str],
+        version: str,
+        answer: str,
+        scope: str = "",
+    ):
+        """Cache the answer given to a question."""
+        vector = self._normalize(embedding)
+        if vector is None or not answer:
+            return
+
+        with self._lock:
+            self._sync_version(version)
+            self._entries[self._next_key] = CachedAnswer(
+                vector=vector,
+                context_ids=tuple(context_ids),
+                scope=scope,
+                answer=answer,
+                created_at=time.time(),
+            )
+            self._next_key += 1
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def remember(
+        self,
+        stream: Iterator[Any],
+        embedding: Sequence[float],
+        context_ids: List[str],
+        version: str,
+        scope: str = "",
+    ) -> Iterator[Any]:
+        """Pass a stream (text or completion chunks) through and cache it once it completes."""
+        parts = []
+        for part in stream:
+            if isinstance(part, str):
+                parts.append(part)
+            elif part.choices and part.choices[0].delta.content:
+                parts.append(part.choices[0].delta.content)
+            yield part
+        self.store(embedding, context_ids, version, "".join(parts), scope)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+@st.cache_resource
+def get_answer_cache() -> SemanticAnswerCache:
+    """Shared answer cache, configured by the optional `[answer_cache]` secrets section."""
+    settings = st.secrets.get("answer_cache", {})
+
+    return SemanticAnswerCache(
+        threshold=float(settings.get("threshold", 0.95)),
+        capacity=int(settings.get("capacity", 256)),
+        ttl=float(settings.get("ttl", 3600)),
+    )
@@ -4,32 +4,56 @@ from openai.types.chat.chat_completion import ChatCompletion
 from pydantic import BaseModel
 
 from db.milvus_client import MilvusParagraphClient
-from history import TalkHistory
-from models.intents import IntentOutput
-from prompting import (
+from chatbot.history import TalkHistory
+from chatbot.models.intents import IntentOutput
+from chatbot.prompting import (
     BASE_PROMPT,
+    INTENT_SHOTS,
     build_intent_classifier_prompt,
     build_rag_chat_system_prompt,
     build_rag_chat_user_prompt,
 )
-from config import config
+from chatbot.answer_cache import SemanticAnswerCache, history_scope
+from chatbot.context import ContextAssembler, load_context_assembler
+from chatbot.response_cache import ResponseCache, get_response_cache
+from chatbot.scheduler import Priority, get_scheduler
+from chatbot.singleflight import SingleFlight, request_key
+from chatbot.traces import TraceStore, load_trace_store
+from chatbot.config import config
 
 
-class RequestLog(BaseModel):
-    message: Optional[str]
-    context: TalkHistory
-    failed: bool = False
-    response: Optional[object] = None
+# Shared by every session of the process
+LLM_FLIGHTS = SingleFlight()
 
+# Built once so that every classification shares the same prompt prefix
+DEFAULT_INTENT_SHOTS = TalkHistory.empty()
+for _query, _answer in INTENT_SHOTS:
+    DEFAULT_INTENT_SHOTS = DEFAULT_INTENT_SHOTS.with_shot(_query, _answer)
 
-class WrappedClient(openai.OpenAI):
-    # Complete prompt or user message | Context | Did it failed for some reason(validation, etc.)
-    requests_history: List[RequestLog] = []
 
-    def __init__(self):
+class WrappedClient(openai.OpenAI):
+    def __init__(
+        self,
+        traces: Optional[TraceStore] = None,
+        responses: Optional[ResponseCache] = None,
+    ):
         super().__init__(
             base_url=config["OPENAI_BASE_URL"], api_key=config["OPENAI_KEY"]
         )
+        # Requests made by this client, bounded and owned by a single session
+        self.traces = traces if traces is not None else load_trace_store()
+        # Every session shares the slots of the LLM server through this scheduler
+        self.scheduler = get_scheduler(config["OPENAI_BASE_URL"])
+        # Saved responses for repeated deterministic requests and record/replay
+        self.responses = responses if responses is not None else get_response_cache()
+        # Called with the queue position while a request waits for a slot
+        self.on_wait: Optional[Callable[[int], None]] = None
+
+    def __cache_hints(self) -> dict:
+        """Extra body fields asking the server to reuse its cache for the prompt prefix."""
+        if config["OPENAI_CACHE_PROMPT"]:
+            return {"extra_body": {"cache_prompt": True}}
+        return {}
 
     def __talk_model(
         self,
@@ -37,30 +61,61 @@ class WrappedClient(openai.OpenAI):
         prompt: Optional[str] = None,
         *,
         _from_response: Callable[[ChatCompletion], Any] = lambda x: x,
+        _priority: Priority = Priority.SIMPLE,
         **_extra_args,
     ) -> Any:
-        self.requests_history.append(
-            RequestLog(message=prompt, context=messages.model_copy())
-        )
+        trace = self.traces.start(prompt, messages)
 
-        response = self.chat.completions.create(
+        request = dict(
             model=config["OPENAI_MODEL"],
-            messages=messages.msg_history
-            + (
-                [
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    }
-                ]
-                if prompt
-                else []
-            ),
+            messages=messages.to_openai(prompt),
             temperature=_extra_args.get("temperature", 0.5),
-            **{k: v for k, v in _extra_args.items() if k != "temperature"},
+            **{
+                **self.__cache_hints(),
+                **{k: v for k, v in _extra_args.items() if k != "temperature"},
+            },
         )
-
-        self.requests_history[-1].response = response
+        key = request_key("chat", request)
+
+        # Identical concurrent requests (e.g. a whole class asking the same
+        # first question) share a single upstream generation
+        try:
+            if request.get("stream"):
+                response = self.responses.stream(
+                    key,
+                    request,
+                    lambda: LLM_FLIGHTS.stream(
+                        key,
+                        lambda: self.scheduler.stream(
+                            _priority,
+                            self.traces.session,
+                            lambda: self.chat.completions.create(**request),
+                            self.on_wait,
+                        ),
+                    ),
+                )
+            else:
+                response = self.responses.complete(
+                    key,
+                    request,
+                    lambda: LLM_FLIGHTS.do(
+                        key,
+                        lambda: self.scheduler.run(
+                            _priority,
+                            self.traces.session,
+                            lambda: self.chat.completions.create(**request),
+                            self.on_wait,
+                        ),
+                    ),
+                )
+        except Exception:
+            self.traces.finish(trace, failed=True)
+            raise
+
+        if _extra_args.get("stream"):
+            response = self.traces.wrap_stream(trace, response)
+        else:
+            self.traces.finish(trace, response)
 
         return _from_response(response)
 
@@ -72,34 +127,42 @@ class WrappedClient(openai.OpenAI):
         **kwargs,
     ) -> BaseModel:
         while True:
-            self.requests_history.append(
-                RequestLog(message=prompt, context=messages.model_copy())
-            )
+            trace = self.traces.start(prompt, messages)
 
-            classification = self.beta.chat.completions.parse(
-                messages=messages.msg_history
-                + (
-                    [
-                        {
-                            "role": "user",
-                            "content": prompt,
-                        }
-                    ]
-                    if prompt
-                    else []
-                ),
+            request = dict(
+                messages=messages.to_openai(prompt),
                 model=config["OPENAI_MODEL"],
                 response_format=model,
+                **self.__cache_hints(),
             )
-
-            self.requests_history[-1].response = classification
-
-            classification = classification.choices[0].message
-
-            if result := classification.parsed:
+            key = request_key("parse", model.model_json_schema(), request)
+
+            try:
+                classification = self.responses.complete(
+                    key,
+                    request,
+                    lambda: LLM_FLIGHTS.do(
+                        key,
+                        lambda: self.scheduler.run(
+                            Priority.CLASSIFY,
+                            self.traces.session,
+                            lambda: self.beta.chat.completions.parse(**request),
+                            self.on_wait,
+                        ),
+                    ),
+                    response_format=model,
+                )
+            except Exception:
+                self.traces.finish(trace, failed=True)
+                raise
+
+            result = classification.choices[0].message.parsed
+            self.traces.finish(trace, classification, failed=not result)
+
+            if result:
                 return result
-
-            self.requests_history[-1].failed = True
+            # Do not serve the failed parse again on the retry (fails when replaying)
+            self.responses.discard(key)
 
     def query_simple(
         self, messages: TalkHistory, prompt: str, stream: bool = True, **extra_args
@@ -108,14 +171,19 @@ class WrappedClient(openai.OpenAI):
             messages.with_system_prompt(BASE_PROMPT),
             prompt,
             _from_response=lambda x: x.choices[0].message.content if not stream else x,
+            _priority=Priority.SIMPLE,
             stream=stream,
             **extra_args,
         )
 
     def query_classify_intent(self, shots: TalkHistory, prompt: str) -> IntentOutput:
+        if not len(shots):
+            shots = DEFAULT_INTENT_SHOTS
+
         return self.__talk_model_formatted(
-            shots.with_system_prompt(build_intent_classifier_prompt(prompt)),
+            shots.with_system_prompt(build_intent_classifier_prompt()),
             IntentOutput,
+            prompt,
         )
 
     def query_talk_with_knowledge(
@@ -124,18 +192,50 @@ class WrappedClient(openai.OpenAI):
         prompt: str,
         db_client: MilvusParagraphClient,
         stream: bool = True,
+        cache: Optional[SemanticAnswerCache] = None,
+        query_embedding: Optional[List[float]] = None,
+        assembler: Optional[ContextAssembler] = None,
+        hits: Optional[List[dict]] = None,
         **extra_args,
     ):
-        return self.__talk_model(
+        if assembler is None:
+            assembler = load_context_assembler()
+        if query_embedding is None:
+            query_embedding = db_client.embed_query(prompt)
+        # Hits may come from the conversation's previous turns (see chatbot.retrieval)
+        if hits is None:
+            hits = db_client.search_by_embedding(query_embedding, limit=8)
+
+        if cache is not None:
+            context_ids = [hit["paragraph_id"] for hit in hits]
+            version = db_client.get_corpus_version()
+            # A follow-up depends on the previous turns: only the same conversation shares its answer
+            scope = history_scope(messages)
+
+            if (answer := cache.lookup(query_embedding, context_ids, version, scope)) is not None:
+                return iter([answer]) if stream else answer
+
+        response = self.__talk_model(
             messages.with_system_prompt(build_rag_chat_system_prompt()),
-            build_rag_chat_user_prompt(prompt, db_client),
+            build_rag_chat_user_prompt(prompt, assembler.assemble(hits)),
             _from_response=lambda x: x.choices[0].message.content if not stream else x,
+            _priority=Priority.RAG,
             stream=stream,
             **extra_args,
         )
 
+        if cache is None:
+            return response
+        if stream:
+            return cache.remember(response, query_embedding, context_ids, version, scope)
+
+        cache.store(query_embedding, context_ids, version, response, scope)
+        return response
+
 
-def load_client():
-    client = WrappedClient()
+def load_client(
+    traces: Optional[TraceStore] = None, responses: Optional[ResponseCache] = None
+):
+    client = WrappedClient(traces, responses)
 
     return client
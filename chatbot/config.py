@@ -4,6 +4,7 @@ import streamlit as st
 config = {
     "OPENAI_BASE_URL": st.secrets["llm"]["base_url"],
     "OPENAI_MODEL": st.secrets["llm"]["model"],
-    "OPENAI_KEY": st.secrets["llm"]["api_key"]
+    "OPENAI_KEY": st.secrets["llm"]["api_key"],
+    "OPENAI_CACHE_PROMPT": st.secrets["llm"].get("cache_prompt", True),
     **os.environ,
 }
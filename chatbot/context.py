@@ -0,0 +1,148 @@
+"""
+Assembly of the retrieved context sent to the LLM.
+Turns ranked search hits into labelled snippets in document order, packed up to
+a token budget.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import streamlit as st
+
+from corpus.store import get_corpus
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for Spanish text (about 4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+class ContextAssembler:
+    """Builds the context block of RAG prompts from ranked paragraph hits."""
+
+    def __init__(
+        self,
+        paragraphs: Dict[str, str],
+        articles: Dict[str, Dict[str, Any]],
+        token_budget: int = 1500,
+        neighbours: int = 1,
+        lead_in: bool = True,
+    ):
+        """
+        Args:
+            paragraphs: Paragraph texts of the law keyed by paragraph id
+            articles: Articles of the law with their begin/end paragraph ids
+            token_budget: Maximum estimated tokens of the assembled context
+            neighbours: Paragraphs added at each side of a hit, within its article
+            lead_in: Whether to add the opening paragraph of the article of each hit
+        """
+        self.paragraphs = paragraphs
+        self.articles = articles
+        self.token_budget = token_budget
+        self.neighbours = neighbours
+        self.lead_in = lead_in
+
+    def _label(self, hit: Dict[str, Any]) -> str:
+        metadata = hit.get("metadata", {})
+        if hit.get("source") == "preamble":
+            return "Preámbulo"
+        if metadata.get("article_id"):
+            return f"Artículo {metadata['article_id']}"
+        if metadata.get("provision_title"):
+            return f"Disposición {metadata['provision_title']}"
+        return "Anteproyecto"
+
+    def _expansion(self, hit: Dict[str, Any]) -> List[int]:
+        """Paragraph ids that give context to a hit, closest first."""
+        article_id = hit.get("metadata", {}).get("article_id")
+        if hit.get("source") != "paragraphs" or article_id not in self.articles:
+            return []
+
+        article = self.articles[article_id]
+        paragraph_id = int(hit["paragraph_id"])
+        expansion = []
+
+        if self.lead_in and article["begin"] != paragraph_id:
+            expansion.append(article["begin"])
+        for distance in range(1, self.neighbours + 1):
+            for neighbour in (paragraph_id - distance, paragraph_id + distance):
+                if article["begin"] <= neighbour <= article["end"]:
+                    expansion.append(neighbour)
+
+        return expansion
+
+    def assemble(self, hits: List[Dict[str, Any]]) -> str:
+        """
+        Build the context for a list of hits ranked by relevance.
+
+        Hits are taken first, in rank order, and then their expansions, while the
+        token budget allows it. The result is ordered by position in the document.
+        """
+        selected: Dict[Tuple[str, int], Tuple[str, str]] = {}
+        used = 0
+
+        def take(key: Tuple[str, int], label: str, text: Optional[str]):
+            nonlocal used
+            if not text or key in selected:
+                return
+            cost = estimate_tokens(text)
+            if used + cost <= self.token_budget:
+                selected[key] = (label, text)
+                used += cost
+
+        ranked = []
+        seen = set()
+        for hit in hits:
+            key = (hit.get("source", "paragraphs"), int(hit["paragraph_id"]))
+            if key not in seen:
+                seen.add(key)
+                ranked.append((key, hit))
+
+        # Expansions never take the place of a ranked hit
+        for key, hit in ranked:
+            take(key, self._label(hit), hit.get("content"))
+
+        for key, hit in ranked:
+            if key not in selected:
+                continue
+            for paragraph_id in self._expansion(hit):
+                take(
+                    ("paragraphs", paragraph_id),
+                    self._label(hit),
+                    self.paragraphs.get(str(paragraph_id)),
+                )
+
+        # Preamble first, then the body of the law in document order
+        blocks = []
+        previous = None
+        for source, paragraph_id in sorted(
+            selected, key=lambda k: (k[0] != "preamble", k[1])
+        ):
+            label, text = selected[(source, paragraph_id)]
+            if previous is None or previous[0] != label:
+                blocks.append(f"[{label}]\n{text}")
+            elif previous[1] + 1 != paragraph_id:
+                blocks[-1] += f"\n(...)\n{text}"
+            else:
+                blocks[-1] += f"\n{text}"
+            previous = (label, paragraph_id)
+
+        return "\n\n".join(blocks)
+
+
+def load_context_assembler() -> ContextAssembler:
+    """Shared assembler over the law, configured by the optional `[context]` secrets section."""
+    return _build_context_assembler(get_corpus().signature)
+
+
+@st.cache_resource(max_entries=1)
+def _build_context_assembler(corpus_signature: str) -> ContextAssembler:
+    settings = st.secrets.get("context", {})
+    project = get_corpus().project
+
+    return ContextAssembler(
+        project["paragraphs"],
+        project["articles"],
+        token_budget=int(settings.get("token_budget", 1500)),
+        neighbours=int(settings.get("neighbours", 1)),
+        lead_in=bool(settings.get("lead_in", True)),
+    )
@@ -1,37 +1,127 @@
-from typing import List, Self, Tuple
-from pydantic import BaseModel
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Self, Tuple
 
 
-class Message(BaseModel):
+@dataclass(frozen=True, slots=True)
+class Message:
     role: str
     content: str
 
+    def to_openai(self) -> Dict[str, str]:
+        return {"role": self.role, "content": self.content}
 
-class TalkHistory(BaseModel):
-    msg_history: List[Message] = []
+
+@dataclass(frozen=True, slots=True)
+class _Node:
+    message: Message
+    previous: Optional["_Node"]
+
+
+class TalkHistory:
+    """
+    Immutable conversation history.
+
+    Messages are kept in a linked list from the newest one back, so appending a
+    turn or setting the system prompt returns a new history in O(1) that shares
+    every previous message with the original one.
+    """
+
+    __slots__ = ("_system", "_last", "_length")
+
+    def __init__(
+        self,
+        messages: Iterable[Message] = (),
+        system: Optional[Message] = None,
+    ):
+        self._system = system
+        self._last: Optional[_Node] = None
+        self._length = 0
+        for message in messages:
+            self._last = _Node(message, self._last)
+            self._length += 1
+
+    @classmethod
+    def _from_node(
+        cls, system: Optional[Message], last: Optional[_Node], length: int
+    ) -> Self:
+        history = cls.__new__(cls)
+        history._system = system
+        history._last = last
+        history._length = length
+        return history
 
     @staticmethod
     def empty():
-        return TalkHistory(msg_history=[])
+        return TalkHistory()
+
+    @staticmethod
+    def from_dicts(messages: Iterable[Dict[str, str]]) -> "TalkHistory":
+        return TalkHistory(Message(m["role"], m["content"]) for m in messages)
+
+    def __len__(self) -> int:
+        return self._length + (self._system is not None)
+
+    def __repr__(self) -> str:
+        return f"TalkHistory({list(self.msg_history)!r})"
+
+    def __iter__(self) -> Iterator[Message]:
+        return iter(self.msg_history)
+
+    @property
+    def msg_history(self) -> Tuple[Message, ...]:
+        messages = []
+        node = self._last
+        while node is not None:
+            messages.append(node.message)
+            node = node.previous
+        if self._system is not None:
+            messages.append(self._system)
+        return tuple(reversed(messages))
+
+    def last(self, count: int) -> Tuple[Message, ...]:
+        """The last `count` messages, walking only those."""
+        messages = []
+        node = self._last
+        while node is not None and len(messages) < count:
+            messages.append(node.message)
+            node = node.previous
+        return tuple(reversed(messages))
+
+    def to_openai(self, prompt: Optional[str] = None) -> List[Dict[str, str]]:
+        """
+        Messages in the format of the chat completions API, built at send time.
+        A non-empty `prompt` is added at the end as a user message.
+        """
+        messages = [message.to_openai() for message in self.msg_history]
+        if prompt:
+            messages.append({"role": "user", "content": prompt})
+        return messages
+
+    def to_dicts(self) -> List[Dict[str, str]]:
+        return self.to_openai()
 
     def word_count(self) -> int:
         return sum(
             (1 for message in self.msg_history for word in message.content.split(" "))
         )
 
+    def append(self, role: str, content: str) -> Self:
+        return self._from_node(
+            self._system,
+            _Node(Message(role, content), self._last),
+            self._length + 1,
+        )
+
     def with_system_prompt(self, prompt: str) -> Self:
-        return TalkHistory(
-            msg_history=[Message(role="system", content=prompt)] + self.msg_history
+        return self._from_node(
+            Message(role="system", content=prompt), self._last, self._length
         )
 
     def with_shot(self, prompt: str, answer: str) -> Self:
-        return TalkHistory(
-            msg_history=self.msg_history
-            + [
-                Message(role="user", content=prompt),
-                Message(role="assistant", content=answer),
-            ]
-        )
+        return self.append("user", prompt).append("assistant", answer)
 
     def detached_message(self) -> Tuple[Self, Message]:
-        return TalkHistory(msg_history=self.msg_history[:-1]), self.msg_history[-1]
+        return (
+            self._from_node(self._system, self._last.previous, self._length - 1),
+            self._last.message,
+        )
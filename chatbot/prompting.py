@@ -1,30 +1,81 @@
+import json
+
 from chatbot.models import intents
-from db.milvus_client import MilvusParagraphClient
+
+# The system prompts and the shots are sent as the first messages of every request.
+# They must stay byte-identical between turns and users so that the LLM server can
+# reuse its cache for that prefix: anything that changes per turn goes last.
 
 BASE_PROMPT = """Eres un burócrata del ministerio de justicia encargado de clasificar consultas que se realizan sobre el nuevo proyecto de ley de código de trabajo que se está evaluando implementar.
 El tema de esta conversación es únicamente sobre el anteproyecto del código de trabajo y si acaso sobre el código actual."""
 
+INTENT_CLASSIFIER_PROMPT = f"""{BASE_PROMPT}
+Los usuarios nos escriben consultas, cada una en un mensaje.
 
-def build_intent_classifier_prompt(q: str):
-    return f"""{BASE_PROMPT}
-Un usuario nos escribió con la siguiente consulta:
-
-{q}
-
-Tu tarea es clasificar esta consulta. Debes responder únicamente con un json con dos campos: `reasoning` con el razonamiento que permite conocer que tipo de consulta es; y `classification` donde estableces la categoría correcta de esta.
+Tu tarea es clasificar cada consulta. Debes responder únicamente con un json con dos campos: `reasoning` con el razonamiento que permite conocer que tipo de consulta es; y `classification` donde estableces la categoría correcta de esta.
 Las posibles categorías son:
 {''.join([f'- {key}: {value}\n' for key,value in intents.INTENTS.items()])}
 """
 
+# Stable examples for the intent classifier: (consulta, respuesta esperada)
+INTENT_SHOTS = [
+    (
+        "Hola, buenos días",
+        json.dumps(
+            {
+                "reasoning": "Es un saludo, parte del flujo normal de la conversación.",
+                "classification": "neutral",
+            },
+            ensure_ascii=False,
+        ),
+    ),
+    (
+        "¿Cuántos días de vacaciones pagadas le corresponden a un trabajador?",
+        json.dumps(
+            {
+                "reasoning": "Pregunta por un derecho regulado en el Código de Trabajo.",
+                "classification": "law",
+            },
+            ensure_ascii=False,
+        ),
+    ),
+    (
+        "¿Quién ganó el último mundial de fútbol?",
+        json.dumps(
+            {
+                "reasoning": "El deporte no tiene relación con el anteproyecto del Código de Trabajo.",
+                "classification": "not_related",
+            },
+            ensure_ascii=False,
+        ),
+    ),
+    (
+        "¿Me lo puedes explicar con más detalle?",
+        json.dumps(
+            {
+                "reasoning": "Pide ampliar la respuesta anterior sin agregar una nueva pregunta.",
+                "classification": "neutral",
+            },
+            ensure_ascii=False,
+        ),
+    ),
+]
+
+RAG_CHAT_PROMPT = f"""{BASE_PROMPT}
+Tu tarea es conversar en español con el usuario basado en el contenido del anteproyecto. Para que puedas responder con conocimiento y no asumir nada, antes del mensaje del usuario se envían fragmentos del anteproyecto que se relacionan con lo mencionado por este, separados del mensaje por "====". Los fragmentos de turnos anteriores no se repiten."""
+
+
+def build_intent_classifier_prompt():
+    return INTENT_CLASSIFIER_PROMPT
+
 
 def build_rag_chat_system_prompt():
-    return f"""{BASE_PROMPT}
-Tu tarea es conversar en español con el usuario basado en el contenido del anteproyecto. Para que puedas responder con conocimiento y no asumir nada junto al mensaje del usuario, separado por "====" se envían fragmentos del anteproyecto que se relacionan con lo mencionado por este."""
+    return RAG_CHAT_PROMPT
 
 
-def build_rag_chat_user_prompt(q: str, db_client: MilvusParagraphClient):
-    return f"""{q}
+def build_rag_chat_user_prompt(q: str, context: str):
+    return f"""{context}
 
 ====
 
-{'\n\n'.join(v for p in db_client.search_similar_paragraphs(q,limit=5) for _,v in p)}"""
+{q}"""
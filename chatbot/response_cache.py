@@ -0,0 +1,251 @@
+"""
+Disk-backed cache of LLM responses, keyed by a hash of the whole request
+(model, messages, parameters and response format).
+
+Modes:
+    off:    every request goes to the LLM server
+    cache:  deterministic requests (low temperature) are answered from disk
+            when possible, with LRU and TTL eviction
+    record: every request goes to the LLM server and its response is saved,
+            streams with the time each chunk arrived
+    replay: every request is answered from disk, replaying streams with their
+            recorded timing; a request that was never recorded fails
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, Optional, Type
+
+from openai.types.chat import ChatCompletion, ChatCompletionChunk, ParsedChatCompletion
+from pydantic import BaseModel
+import streamlit as st
+
+
+MODES = ("off", "cache", "record", "replay")
+
+
+class ReplayMiss(Exception):
+    """Raised in replay mode for a request that was not recorded."""
+
+
+class ResponseCache:
+    """Responses of the LLM server saved as one JSON file per request."""
+
+    def __init__(
+        self,
+        path: str,
+        mode: str = "off",
+        capacity: int = 1024,
+        ttl: float = 86400,
+        max_temperature: float = 0.3,
+    ):
+        """
+        Args:
+            path: Directory where the responses are saved
+            mode: One of MODES
+            capacity: Maximum number of responses kept in cache mode
+            ttl: Seconds a response is served in cache mode
+            max_temperature: Highest temperature considered deterministic in cache mode
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown LLM cache mode '{mode}', expected one of {MODES}")
+
+        self.path = path
+        self.mode = mode
+        self.capacity = capacity
+        self.ttl = ttl
+        self.max_temperature = max_temperature
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Keys from the least to the most recently used
+        self._index: "OrderedDict[str, None]" = OrderedDict()
+
+        if mode != "off":
+            os.makedirs(path, exist_ok=True)
+            files = [
+                entry for entry in os.scandir(path) if entry.name.endswith(".json")
+            ]
+            for entry in sorted(files, key=lambda e: e.stat().st_mtime):
+                self._index[entry.name[: -len(".json")]] = None
+
+    def cacheable(self, request: Dict[str, Any]) -> bool:
+        """Whether a request may be answered from disk."""
+        if self.mode == "replay":
+            return True
+        if self.mode != "cache":
+            return False
+        temperature = request.get("temperature")
+        return temperature is None or temperature <= self.max_temperature
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json")
+
+    def _load(self, key: str) -> Optional[dict]:
+        with self._lock:
+            known = key in self._index
+        if not known:
+            return None
+
+        try:
+            with open(self._file(key), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Failed to read cached LLM response {key}: {e}")
+            self._forget(key)
+            return None
+
+        if self.mode == "cache" and time.time() - entry["created_at"] > self.ttl:
+            self._forget(key)
+            return None
+
+        with self._lock:
+            self._index.move_to_end(key)
+        if self.mode == "cache":
+            # The modification time keeps the LRU order across restarts
+            try:
+                os.utime(self._file(key))
+            except OSError:
+                pass
+        return entry
+
+    def _forget(self, key: str):
+        with self._lock:
+            self._index.pop(key, None)
+        try:
+            os.remove(self._file(key))
+        except OSError:
+            pass
+
+    def discard(self, key: str):
+        """
+        Drop a saved response that turned out to be unusable (e.g. a failed parse).
+        In replay mode the recording cannot be replaced, so a retry would get
+        it again: raises ReplayMiss instead.
+        """
+        if self.mode == "replay":
+            raise ReplayMiss(f"Recorded response for request {key} is unusable")
+        if self.mode in ("cache", "record"):
+            self._forget(key)
+
+    def _save(self, key: str, entry: dict):
+        entry["created_at"] = time.time()
+        temp = f"{self._file(key)}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(temp, self._file(key))
+        except OSError as e:
+            print(f"Failed to save LLM response {key}: {e}")
+            return
+
+        with self._lock:
+            self._index[key] = None
+            self._index.move_to_end(key)
+            evicted = []
+            if self.mode == "cache":
+                while len(self._index) > self.capacity:
+                    evicted.append(self._index.popitem(last=False)[0])
+        for old in evicted:
+            try:
+                os.remove(self._file(old))
+            except OSError:
+                pass
+
+    def _lookup(self, key: str, request: Dict[str, Any]) -> Optional[dict]:
+        if not self.cacheable(request):
+            return None
+        entry = self._load(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        if self.mode == "replay":
+            raise ReplayMiss(f"No recorded response for request {key}")
+        return None
+
+    def _should_save(self, request: Dict[str, Any]) -> bool:
+        return self.mode == "record" or (self.mode == "cache" and self.cacheable(request))
+
+    def complete(
+        self,
+        key: str,
+        request: Dict[str, Any],
+        fn: Callable[[], ChatCompletion],
+        response_format: Optional[Type[BaseModel]] = None,
+    ) -> ChatCompletion:
+        """Response of a non-streamed request, parsed into `response_format` if given."""
+        response_type = (
+            ParsedChatCompletion[response_format] if response_format else ChatCompletion
+        )
+        if (entry := self._lookup(key, request)) is not None:
+            return response_type.model_validate(entry["response"])
+
+        response = fn()
+        if self._should_save(request):
+            self._save(
+                key, {"response": response.model_dump(mode="json", warnings=False)}
+            )
+        return response
+
+    def stream(
+        self,
+        key: str,
+        request: Dict[str, Any],
+        fn: Callable[[], Iterator[ChatCompletionChunk]],
+    ) -> Iterator[ChatCompletionChunk]:
+        """Chunks of a streamed request."""
+        if (entry := self._lookup(key, request)) is not None:
+            return self._replay(entry["chunks"], timed=self.mode == "replay")
+
+        if not self._should_save(request):
+            return fn()
+        # Offsets are measured from the request, so replays keep the time to first token
+        start = time.monotonic()
+        return self._recording(key, fn(), start)
+
+    def _recording(
+        self, key: str, upstream: Iterator[ChatCompletionChunk], start: float
+    ) -> Iterator[ChatCompletionChunk]:
+        chunks = []
+        for chunk in upstream:
+            chunks.append(
+                [time.monotonic() - start, chunk.model_dump(mode="json", warnings=False)]
+            )
+            yield chunk
+        # Only complete streams are saved
+        self._save(key, {"chunks": chunks})
+
+    def _replay(self, chunks: list, timed: bool) -> Iterator[ChatCompletionChunk]:
+        start = time.monotonic()
+        for offset, chunk in chunks:
+            if timed and (delay := offset - (time.monotonic() - start)) > 0:
+                time.sleep(delay)
+            yield ChatCompletionChunk.model_validate(chunk)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "entries": len(self._index),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+@st.cache_resource
+def get_response_cache() -> ResponseCache:
+    """Response cache shared by every session, configured by the optional `[llm_cache]` section."""
+    settings = st.secrets.get("llm_cache", {})
+
+    return ResponseCache(
+        path=settings.get("path", "./data/llm_cache"),
+        mode=settings.get("mode", "off"),
+        capacity=int(settings.get("capacity", 1024)),
+        ttl=float(settings.get("ttl", 86400)),
+        max_temperature=float(settings.get("max_temperature", 0.3)),
+    )
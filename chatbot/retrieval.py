@@ -0,0 +1,150 @@
+"""
+Retrieval scoped to a conversation.
+Keeps the hits and query vectors of the last turns so that follow-up
+questions reuse the context already found, searching only for what they add
+to it instead of starting over.
+"""
+
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import streamlit as st
+
+from db.milvus_client import MilvusParagraphClient
+
+
+def _hit_key(hit: Dict[str, Any]) -> Tuple[str, int]:
+    return hit.get("source", "paragraphs"), int(hit["paragraph_id"])
+
+
+def _unit(vector: np.ndarray) -> Optional[np.ndarray]:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else None
+
+
+class ConversationRetrieval:
+    """Hits of the recent turns of one conversation."""
+
+    def __init__(
+        self,
+        db_client: MilvusParagraphClient,
+        limit: int = 8,
+        max_hits: int = 12,
+        max_turns: int = 3,
+        reuse_threshold: float = 0.92,
+        follow_up_threshold: float = 0.6,
+    ):
+        """
+        Args:
+            db_client: Client used for the searches
+            limit: Hits of a fresh search
+            max_hits: Hits kept for the conversation after merging turns
+            max_turns: Previous queries a new one is compared with
+            reuse_threshold: Similarity to a previous query above which its hits are reused as is
+            follow_up_threshold: Similarity above which a query extends the previous hits
+                instead of replacing them
+        """
+        self.db_client = db_client
+        self.limit = limit
+        self.max_hits = max_hits
+        self.reuse_threshold = reuse_threshold
+        self.follow_up_threshold = follow_up_threshold
+        self.queries: Deque[np.ndarray] = deque(maxlen=max_turns)
+        self.hits: List[Dict[str, Any]] = []
+        self.searches = 0
+        self.reused = 0
+        self.extended = 0
+
+    @property
+    def has_context(self) -> bool:
+        return bool(self.hits)
+
+    def clear(self):
+        self.queries.clear()
+        self.hits = []
+
+    def retrieve(self, query_embedding: Sequence[float]) -> List[Dict[str, Any]]:
+        """
+        Hits for a new query of the conversation.
+
+        A repeated or rephrased question reuses the previous hits, a follow-up
+        searches only for the part of its vector not covered by the previous
+        queries and merges what it finds with the previous hits, and anything
+        else starts a fresh context.
+        """
+        query = _unit(np.asarray(query_embedding, dtype=np.float32))
+        if query is None:
+            # No usable embedding (the embedding service failed): keep what we have
+            self.reused += 1
+            return self.hits
+
+        if not self.queries:
+            return self._fresh(query)
+
+        previous = np.stack(self.queries)
+        similarity = float(np.max(previous @ query))
+
+        if similarity >= self.reuse_threshold:
+            self.reused += 1
+            self.queries.append(query)
+            return self.hits
+
+        if similarity < self.follow_up_threshold:
+            return self._fresh(query)
+
+        # New aspect: the query without its projection on the recent topic
+        topic = _unit(previous.mean(axis=0))
+        aspect = _unit(query - (query @ topic) * topic) if topic is not None else query
+        found = self._search(aspect if aspect is not None else query, self.limit // 2)
+
+        self.extended += 1
+        self.queries.append(query)
+        self.hits = self._merge(found, self.hits)
+        return self.hits
+
+    def reuse(self) -> List[Dict[str, Any]]:
+        """Hits of the previous turns, for a follow-up with nothing new to search (e.g. 'explícalo mejor')."""
+        self.reused += 1
+        return self.hits
+
+    def _fresh(self, query: np.ndarray) -> List[Dict[str, Any]]:
+        self.queries.clear()
+        self.queries.append(query)
+        self.hits = self._merge(self._search(query, self.limit), [])
+        return self.hits
+
+    def _search(self, vector: np.ndarray, limit: int) -> List[Dict[str, Any]]:
+        self.searches += 1
+        return self.db_client.search_by_embedding(vector.tolist(), limit=max(limit, 1))
+
+    def _merge(
+        self, new: List[Dict[str, Any]], old: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        # The hits of the latest query rank first, previous ones fill the rest
+        merged = {}
+        for hit in [*new, *old]:
+            merged.setdefault(_hit_key(hit), hit)
+        return list(merged.values())[: self.max_hits]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": len(self.hits),
+            "searches": self.searches,
+            "reused": self.reused,
+            "extended": self.extended,
+        }
+
+
+def new_conversation_retrieval(db_client: MilvusParagraphClient) -> ConversationRetrieval:
+    """Retrieval for a new conversation, configured by the optional `[retrieval]` section."""
+    settings = st.secrets.get("retrieval", {})
+
+    return ConversationRetrieval(
+        db_client,
+        limit=int(settings.get("limit", 8)),
+        max_hits=int(settings.get("max_hits", 12)),
+        max_turns=int(settings.get("max_turns", 3)),
+        reuse_threshold=float(settings.get("reuse_threshold", 0.92)),
+        follow_up_threshold=float(settings.get("follow_up_threshold", 0.6)),
+    )
@@ -0,0 +1,181 @@
+"""
+Process-wide scheduler of the requests sent to each upstream server.
+Limits how many requests run at once on every upstream and orders the waiting
+ones by priority (cheap classifications and lookups before long generations)
+and then fairly among users.
+"""
+
+import heapq
+import itertools
+import threading
+from enum import IntEnum
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import streamlit as st
+
+
+class Priority(IntEnum):
+    CLASSIFY = 0
+    LOOKUP = 0  # Embeddings for FAQ lookups and searches
+    SIMPLE = 1
+    RAG = 2
+
+
+class QueueFull(Exception):
+    """Raised when an upstream already has too many requests waiting."""
+
+
+class LLMScheduler:
+    """Bounded priority queue in front of a single upstream server."""
+
+    def __init__(self, max_concurrency: int = 2, max_queue: int = 32):
+        """
+        Args:
+            max_concurrency: Requests allowed to run at the same time on the upstream
+            max_queue: Requests allowed to wait; further ones raise QueueFull
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.running = 0
+        self._queue: List[Tuple[int, int, int, Optional[str]]] = []
+        self._turns: Dict[Optional[str], int] = {}
+        self._round = 0
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+
+    def _position(self, entry) -> int:
+        return sorted(self._queue).index(entry) + 1
+
+    def acquire(
+        self,
+        priority: Priority,
+        user: Optional[str] = None,
+        on_wait: Optional[Callable[[int], None]] = None,
+    ):
+        """
+        Wait for a free slot on the upstream.
+
+        Within a priority, every request of a user is queued one turn after the
+        previous one of that user, so users with many requests do not starve the rest.
+        `on_wait` is called with the queue position whenever it changes.
+        """
+        with self._condition:
+            if not self._queue and self.running < self.max_concurrency:
+                self.running += 1
+                return
+
+            if len(self._queue) >= self.max_queue:
+                raise QueueFull(f"{len(self._queue)} requests already waiting")
+
+            turn = max(self._turns.get(user, 0), self._round) + 1
+            self._turns[user] = turn
+            entry = (int(priority), turn, next(self._counter), user)
+            heapq.heappush(self._queue, entry)
+
+        try:
+            last_position = None
+            while True:
+                with self._condition:
+                    if self._queue[0] == entry and self.running < self.max_concurrency:
+                        heapq.heappop(self._queue)
+                        self._round = turn
+                        self.running += 1
+                        self._prune_turns()
+                        # The next in line may also fit in a free slot
+                        self._condition.notify_all()
+                        return
+                    position = self._position(entry)
+                    if position == last_position:
+                        self._condition.wait(timeout=1.0)
+                        continue
+
+                # The callback may touch the UI (and raise), so it runs without the lock
+                if on_wait is not None:
+                    on_wait(position)
+                last_position = position
+        except BaseException:
+            # A waiter that gives up (e.g. a Streamlit rerun) must not block the queue
+            with self._condition:
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                self._condition.notify_all()
+            raise
+
+    def _prune_turns(self):
+        # Turns already reached give no priority, forget them
+        self._turns = {user: turn for user, turn in self._turns.items() if turn > self._round}
+
+    def release(self):
+        with self._condition:
+            self.running -= 1
+            self._condition.notify_all()
+
+    def run(
+        self,
+        priority: Priority,
+        user: Optional[str],
+        fn: Callable[[], Any],
+        on_wait: Optional[Callable[[int], None]] = None,
+    ) -> Any:
+        """Run `fn` once a slot is free."""
+        self.acquire(priority, user, on_wait)
+        try:
+            return fn()
+        finally:
+            self.release()
+
+    def stream(
+        self,
+        priority: Priority,
+        user: Optional[str],
+        fn: Callable[[], Iterator[Any]],
+        on_wait: Optional[Callable[[int], None]] = None,
+    ) -> Iterator[Any]:
+        """Start the stream returned by `fn` once a slot is free, holding it until the stream ends."""
+        self.acquire(priority, user, on_wait)
+        try:
+            upstream = fn()
+        except BaseException:
+            self.release()
+            raise
+        return self._releasing(upstream)
+
+    def _releasing(self, upstream: Iterator[Any]) -> Iterator[Any]:
+        try:
+            yield from upstream
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {"running": self.running, "waiting": len(self._queue)}
+
+
+# Limits of every pool when not configured. Embeddings have their own pool, so
+# short lookups never wait behind generations even on a shared upstream
+POOL_DEFAULTS = {
+    "llm": {"max_concurrency": 2, "max_queue": 32},
+    "embedding": {"max_concurrency": 4, "max_queue": 64},
+}
+
+_schedulers: Dict[Tuple[str, str], LLMScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(upstream: str, pool: str = "llm") -> LLMScheduler:
+    """
+    Scheduler shared by every request of a pool ('llm' or 'embedding') to an
+    upstream (by base URL), configured by `[scheduler]` and `[scheduler.embedding]`.
+    """
+    with _schedulers_lock:
+        key = (pool, upstream)
+        if key not in _schedulers:
+            settings = st.secrets.get("scheduler", {})
+            if pool != "llm":
+                settings = settings.get(pool, {})
+            defaults = POOL_DEFAULTS[pool]
+            _schedulers[key] = LLMScheduler(
+                max_concurrency=int(settings.get("max_concurrency", defaults["max_concurrency"])),
+                max_queue=int(settings.get("max_queue", defaults["max_queue"])),
+            )
+        return _schedulers[key]
@@ -0,0 +1,201 @@
+"""
+Persistent chat conversations in a local SQLite database (WAL mode).
+Turns are written by a background thread so answering never waits on disk,
+and conversations are read back one page of messages at a time.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import streamlit as st
+
+from chatbot.history import Message
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    user TEXT NOT NULL,
+    title TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS conversations_by_user
+    ON conversations (user, updated_at DESC);
+CREATE TABLE IF NOT EXISTS messages (
+    conversation_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (conversation_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+@dataclass
+class Conversation:
+    id: str
+    title: str
+    updated_at: float
+
+
+@dataclass
+class MessagePage:
+    messages: List[Message]
+    # Sequence number of the first message of the page, to load the previous one
+    first_seq: int
+
+
+class ChatSessionStore:
+    """Conversations of every user, shared by all the sessions of the process."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+
+        self._local = threading.local()
+        self._writes: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _reader(self) -> sqlite3.Connection:
+        # WAL lets every thread read while the writer thread commits
+        if not hasattr(self._local, "connection"):
+            self._local.connection = self._connect()
+        return self._local.connection
+
+    @staticmethod
+    def new_conversation_id() -> str:
+        return uuid.uuid4().hex
+
+    def append_messages(
+        self, user: str, conversation_id: str, messages: Sequence[Tuple[str, str]]
+    ):
+        """Queue (role, content) messages to be added at the end of a conversation."""
+        self._writes.put((user, conversation_id, list(messages), time.time()))
+
+    def flush(self):
+        """Wait until every queued write is committed."""
+        self._writes.join()
+
+    def _write_loop(self):
+        connection = self._connect()
+        while True:
+            write = self._writes.get()
+            try:
+                # Group every write queued meanwhile into a single transaction
+                batch = [write]
+                while True:
+                    try:
+                        batch.append(self._writes.get_nowait())
+                    except queue.Empty:
+                        break
+                try:
+                    with connection:
+                        for write in batch:
+                            self._insert(connection, *write)
+                except sqlite3.Error as e:
+                    print(f"Failed to save {len(batch)} chat turns in one transaction: {e}")
+                    self._insert_each(connection, batch)
+            finally:
+                for _ in batch:
+                    self._writes.task_done()
+
+    @staticmethod
+    def _insert_each(connection: sqlite3.Connection, batch: List[tuple]):
+        # One transaction per turn, so a failing turn only loses itself
+        for write in batch:
+            try:
+                with connection:
+                    ChatSessionStore._insert(connection, *write)
+            except sqlite3.Error as e:
+                user, conversation_id, messages, created_at = write
+                print(
+                    f"Lost {len(messages)} chat messages of {user} in conversation "
+                    f"{conversation_id} ({created_at}): {messages!r}: {e}"
+                )
+
+    @staticmethod
+    def _insert(
+        connection: sqlite3.Connection,
+        user: str,
+        conversation_id: str,
+        messages: List[Tuple[str, str]],
+        created_at: float,
+    ):
+        title = next((content for role, content in messages if role == "user"), "")
+        connection.execute(
+            """
+            INSERT INTO conversations (id, user, title, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET updated_at = excluded.updated_at
+            """,
+            (conversation_id, user, title[:80], created_at, created_at),
+        )
+        (next_seq,) = connection.execute(
+            "SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE conversation_id = ?",
+            (conversation_id,),
+        ).fetchone()
+        connection.executemany(
+            "INSERT INTO messages VALUES (?, ?, ?, ?, ?)",
+            [
+                (conversation_id, next_seq + i, role, content, created_at)
+                for i, (role, content) in enumerate(messages)
+            ],
+        )
+
+    def list_conversations(self, user: str, limit: int = 20) -> List[Conversation]:
+        """Most recently updated conversations of a user."""
+        rows = self._reader().execute(
+            """
+            SELECT id, title, updated_at FROM conversations
+            WHERE user = ? ORDER BY updated_at DESC LIMIT ?
+            """,
+            (user, limit),
+        )
+        return [Conversation(*row) for row in rows]
+
+    def load_page(
+        self, conversation_id: str, limit: int = 20, before_seq: Optional[int] = None
+    ) -> MessagePage:
+        """The last `limit` messages of a conversation before `before_seq` (the newest if None)."""
+        rows = self._reader().execute(
+            """
+            SELECT seq, role, content FROM messages
+            WHERE conversation_id = ? AND seq < ?
+            ORDER BY seq DESC LIMIT ?
+            """,
+            (conversation_id, before_seq if before_seq is not None else 2**62, limit),
+        ).fetchall()
+        rows.reverse()
+
+        return MessagePage(
+            messages=[Message(role, content) for _, role, content in rows],
+            first_seq=rows[0][0] if rows else 0,
+        )
+
+
+@st.cache_resource
+def get_session_store() -> ChatSessionStore:
+    """Store shared by every session, saved at `dbs.sessions` of the secrets."""
+    return ChatSessionStore(st.secrets["dbs"].get("sessions", "./data/sessions.db"))
+
+
+def get_page_size() -> int:
+    return int(st.secrets.get("sessions", {}).get("page_size", 20))
@@ -0,0 +1,137 @@
+"""
+Process-wide coalescing of identical in-flight requests.
+When several sessions make the same request at the same time, only the first
+one reaches the upstream server and every caller gets its result. Streamed
+results are fanned out to every caller as they arrive.
+"""
+
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+def request_key(*parts: Any) -> str:
+    """Stable hash of the parts identifying a request (model, messages, parameters)."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class _Call:
+    """Result of an in-flight request, shared by every caller waiting on it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _Broadcast:
+    """Buffer of a streamed result that any number of subscribers can read."""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.condition = threading.Condition()
+
+    def pump(self, stream: Iterator[Any]):
+        try:
+            for item in stream:
+                with self.condition:
+                    self.items.append(item)
+                    self.condition.notify_all()
+        except BaseException as e:
+            self.error = e
+        finally:
+            with self.condition:
+                self.finished = True
+                self.condition.notify_all()
+
+    def subscribe(self) -> Iterator[Any]:
+        position = 0
+        while True:
+            with self.condition:
+                while position >= len(self.items) and not self.finished:
+                    self.condition.wait()
+                if position < len(self.items):
+                    item = self.items[position]
+                elif self.error is not None:
+                    raise self.error
+                else:
+                    return
+            position += 1
+            yield item
+
+
+class SingleFlight:
+    """Shares one upstream call among identical concurrent requests."""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run `fn` unless an identical request is in flight, and return its result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stream(self, key: str, fn: Callable[[], Iterator[Any]]) -> Iterator[Any]:
+        """
+        Start the stream returned by `fn` unless an identical one is in flight,
+        and return an iterator over all of its items.
+
+        The upstream stream is consumed by a background thread, so a caller
+        that stops reading does not hold back the others.
+        """
+        with self._lock:
+            broadcast = self._streams.get(key)
+            if broadcast is not None:
+                self.coalesced += 1
+                return broadcast.subscribe()
+            broadcast = self._streams[key] = _Broadcast()
+
+        try:
+            upstream = fn()
+        except BaseException as e:
+            with self._lock:
+                del self._streams[key]
+            broadcast.error = e
+            with broadcast.condition:
+                broadcast.finished = True
+                broadcast.condition.notify_all()
+            raise
+
+        def pump():
+            try:
+                broadcast.pump(upstream)
+            finally:
+                with self._lock:
+                    self._streams.pop(key, None)
+
+        threading.Thread(target=pump, daemon=True).start()
+        return broadcast.subscribe()
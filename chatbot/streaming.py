@@ -0,0 +1,172 @@
+"""
+Adapter between the streamed answers of the LLM and the chat UI.
+Extracts the text of the completion chunks, hides the `<think>` blocks of
+reasoning models as they stream and groups the deltas into larger updates,
+so a long answer is not sent to the browser one token at a time.
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import streamlit as st
+
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+
+def _delta_text(part: Any) -> str:
+    """Text of a completion chunk, or the part itself when it is already text."""
+    if isinstance(part, str):
+        return part
+    if part.choices and part.choices[0].delta.content:
+        return part.choices[0].delta.content
+    return ""
+
+
+def _partial_tag(text: str, tag: str) -> int:
+    """Length of the longest suffix of `text` that is a prefix of `tag`."""
+    for size in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:size]):
+            return size
+    return 0
+
+
+class ThinkFilter:
+    """Removes `<think>...</think>` blocks from text fed in arbitrary pieces."""
+
+    def __init__(self):
+        self.thinking = False
+        self._pending = ""
+
+    def feed(self, text: str) -> str:
+        """Visible text of the new piece. A tag split between pieces is held back until complete."""
+        text = self._pending + text
+        self._pending = ""
+        visible = []
+
+        while text:
+            tag = THINK_CLOSE if self.thinking else THINK_OPEN
+            index = text.find(tag)
+            if index >= 0:
+                if not self.thinking:
+                    visible.append(text[:index])
+                text = text[index + len(tag):]
+                self.thinking = not self.thinking
+                continue
+
+            keep = _partial_tag(text, tag)
+            if not self.thinking:
+                visible.append(text[: len(text) - keep])
+            self._pending = text[len(text) - keep:]
+            break
+
+        return "".join(visible)
+
+    def flush(self) -> str:
+        """Text held back at the end of the stream."""
+        text, self._pending = self._pending, ""
+        return "" if self.thinking else text
+
+
+@dataclass
+class StreamStats:
+    started_at: float = field(default_factory=time.monotonic)
+    ttft: Optional[float] = None  # Seconds until the first visible text
+    finished_at: Optional[float] = None
+    tokens: int = 0  # Streamed deltas, one token each for llama.cpp and vLLM
+    updates: int = 0  # Pieces handed to the UI
+
+    @property
+    def tokens_per_second(self) -> float:
+        if self.finished_at is None or self.ttft is None:
+            return 0.0
+        generation = self.finished_at - self.started_at - self.ttft
+        return self.tokens / generation if generation > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "ttft": self.ttft,
+            "tokens": self.tokens,
+            "updates": self.updates,
+            "tokens_per_second": self.tokens_per_second,
+        }
+
+
+class CoalescedStream:
+    """Iterator of text pieces grouped by time or size, to be given to `st.write_stream`."""
+
+    def __init__(
+        self,
+        stream: Iterator[Any],
+        interval: float = 0.05,
+        max_chars: int = 64,
+        hide_thinking: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            stream: Completion chunks or text pieces
+            interval: Seconds after which the buffered text is sent
+            max_chars: Buffered characters after which the text is sent
+            hide_thinking: Drop the `<think>` blocks of reasoning models
+        """
+        self.stream = stream
+        self.interval = interval
+        self.max_chars = max_chars
+        self.think_filter = ThinkFilter() if hide_thinking else None
+        self.clock = clock
+        self.stats = StreamStats(started_at=clock())
+
+    def __iter__(self) -> Iterator[str]:
+        buffer = []
+        buffered = 0
+        last_update = self.clock()
+
+        for part in self.stream:
+            text = _delta_text(part)
+            if not text:
+                continue
+            self.stats.tokens += 1
+
+            if self.think_filter is not None:
+                text = self.think_filter.feed(text)
+                if not text:
+                    continue
+
+            buffer.append(text)
+            buffered += len(text)
+            now = self.clock()
+
+            # The first visible text goes out at once so the answer starts showing
+            if self.stats.ttft is None:
+                self.stats.ttft = now - self.stats.started_at
+            elif buffered < self.max_chars and now - last_update < self.interval:
+                continue
+
+            self.stats.updates += 1
+            yield "".join(buffer)
+            buffer, buffered, last_update = [], 0, now
+
+        if self.think_filter is not None:
+            buffer.append(self.think_filter.flush())
+        self.stats.finished_at = self.clock()
+
+        if text := "".join(buffer):
+            if self.stats.ttft is None:
+                self.stats.ttft = self.stats.finished_at - self.stats.started_at
+            self.stats.updates += 1
+            yield text
+
+
+def coalesce_stream(stream: Iterator[Any]) -> CoalescedStream:
+    """Wrap a stream using the optional `[streaming]` section of the secrets."""
+    settings = st.secrets.get("streaming", {})
+
+    return CoalescedStream(
+        stream,
+        interval=float(settings.get("interval_ms", 50)) / 1000,
+        max_chars=int(settings.get("max_chars", 64)),
+        hide_thinking=bool(settings.get("hide_thinking", True)),
+    )
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Tests of the semantic answer cache. Run from the repository root:
+    python -m chatbot.test_answer_cache
+"""
+
+from chatbot.answer_cache import SemanticAnswerCache, history_scope
+from chatbot.history import TalkHistory
+
+
+QUERY = [1.0, 0.0, 0.0]
+CONTEXT = ["10", "11"]
+
+
+def test_follow_up_depends_on_history():
+    cache = SemanticAnswerCache()
+    permanent = TalkHistory.empty().with_shot(
+        "¿Qué es un contrato por tiempo indeterminado?", "Es el contrato sin fecha de fin..."
+    )
+    seasonal = TalkHistory.empty().with_shot(
+        "¿Qué es un contrato de temporada?", "Es el contrato de una campaña..."
+    )
+
+    cache.store(QUERY, CONTEXT, "v1", "Respuesta sobre los indeterminados", history_scope(permanent))
+
+    assert cache.lookup(QUERY, CONTEXT, "v1", history_scope(seasonal)) is None
+    assert cache.lookup(QUERY, CONTEXT, "v1", history_scope(TalkHistory.empty())) is None
+    assert (
+        cache.lookup(QUERY, CONTEXT, "v1", history_scope(permanent))
+        == "Respuesta sobre los indeterminados"
+    )
+
+
+def test_first_questions_are_shared():
+    cache = SemanticAnswerCache()
+    cache.store(QUERY, CONTEXT, "v1", "Respuesta", history_scope(TalkHistory.empty()))
+
+    assert cache.lookup(QUERY, CONTEXT, "v1", history_scope(TalkHistory())) == "Respuesta"
+
+
+if __name__ == "__main__":
+    test_follow_up_depends_on_history()
+    test_first_questions_are_shared()
+    print("✅ Answer cache tests passed!")
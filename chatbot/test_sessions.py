@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Tests of the chat session store. Run from the repository root:
+    python -m chatbot.test_sessions
+"""
+
+import os
+import tempfile
+
+from chatbot.sessions import ChatSessionStore
+
+
+def queue_together(store: ChatSessionStore, writes):
+    """Queue writes at once, so the writer thread takes them as a single batch."""
+    with store._writes.mutex:
+        store._writes.queue.extend(writes)
+        store._writes.unfinished_tasks += len(writes)
+        store._writes.not_empty.notify()
+
+
+def test_failed_batch_keeps_valid_turns():
+    with tempfile.TemporaryDirectory() as directory:
+        store = ChatSessionStore(os.path.join(directory, "sessions.db"))
+        queue_together(
+            store,
+            [
+                ("ana", "first", [("user", "Hola"), ("assistant", "Buenos días")], 1.0),
+                # Not a valid SQLite value: fails the transaction of the whole batch
+                ("ana", "broken", [("user", "Adiós"), ("assistant", object())], 2.0),
+                ("luis", "second", [("user", "¿Vacaciones?")], 3.0),
+            ],
+        )
+        store.flush()
+
+        assert [c.id for c in store.list_conversations("ana")] == ["first"]
+        assert [c.id for c in store.list_conversations("luis")] == ["second"]
+        page = store.load_page("first")
+        assert [(m.role, m.content) for m in page.messages] == [
+            ("user", "Hola"),
+            ("assistant", "Buenos días"),
+        ]
+        assert store.load_page("broken").messages == []
+
+
+if __name__ == "__main__":
+    test_failed_batch_keeps_valid_turns()
+    print("✅ Session store tests passed!")
@@ -0,0 +1,147 @@
+"""
+Bounded, per-session store for the requests made to the LLM.
+Keeps the most recent traces in a ring buffer and optionally spills every
+recorded trace to a gzip-compressed JSONL file.
+"""
+
+import gzip
+import json
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import streamlit as st
+
+
+@dataclass
+class RequestTrace:
+    """A single request made to the LLM, trimmed to the store payload limit."""
+
+    message: Optional[str]
+    context: List[Dict[str, str]]
+    session: Optional[str] = None
+    failed: bool = False
+    response: Optional[str] = None
+    started_at: float = field(default_factory=time.time)
+    latency: Optional[float] = None
+    ttft: Optional[float] = None
+
+
+class TraceStore:
+    """Ring buffer of request traces with sampling and payload limits."""
+
+    def __init__(
+        self,
+        capacity: int = 50,
+        sample_rate: float = 1.0,
+        max_payload_chars: int = 4000,
+        spill_path: Optional[str] = None,
+        session: Optional[str] = None,
+    ):
+        """
+        Args:
+            capacity: Maximum number of traces kept in memory
+            sample_rate: Fraction of requests that get traced (0.0 - 1.0)
+            max_payload_chars: Maximum characters kept for any message or response
+            spill_path: Optional path of a .jsonl.gz file where traces are appended
+            session: Identifier written along every trace (e.g. the username)
+        """
+        self.traces: deque[RequestTrace] = deque(maxlen=capacity)
+        self.sample_rate = sample_rate
+        self.max_payload_chars = max_payload_chars
+        self.spill_path = spill_path
+        self.session = session
+        self._lock = threading.Lock()
+
+    def __iter__(self) -> Iterator[RequestTrace]:
+        return iter(list(self.traces))
+
+    def __len__(self) -> int:
+        return len(self.traces)
+
+    def clear(self):
+        self.traces.clear()
+
+    def _trim(self, text: Optional[str]) -> Optional[str]:
+        if text is None or len(text) <= self.max_payload_chars:
+            return text
+        return text[: self.max_payload_chars] + f"... [{len(text)} chars]"
+
+    def start(self, message: Optional[str], context: Iterable[Any]) -> Optional[RequestTrace]:
+        """Register a new request. Returns None when the request is not sampled."""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return None
+
+        trace = RequestTrace(
+            message=self._trim(message),
+            context=[
+                {"role": m.role, "content": self._trim(m.content)} for m in context
+            ],
+            session=self.session,
+        )
+        self.traces.append(trace)
+        return trace
+
+    def finish(
+        self,
+        trace: Optional[RequestTrace],
+        response: Any = None,
+        failed: bool = False,
+    ):
+        """Store the outcome of a request and spill it if configured."""
+        if trace is None:
+            return
+
+        trace.latency = time.time() - trace.started_at
+        trace.failed = failed
+        if response is not None:
+            if hasattr(response, "model_dump_json"):
+                response = response.model_dump_json(warnings=False)
+            trace.response = self._trim(str(response))
+
+        if self.spill_path:
+            self._spill(trace)
+
+    def wrap_stream(self, trace: Optional[RequestTrace], stream: Iterator[Any]):
+        """Pass a streamed response through, recording its timing and content."""
+        if trace is None:
+            return stream
+        return self._traced_stream(trace, stream)
+
+    def _traced_stream(self, trace: RequestTrace, stream: Iterator[Any]):
+        parts = []
+        failed = True
+        try:
+            for chunk in stream:
+                if trace.ttft is None:
+                    trace.ttft = time.time() - trace.started_at
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                yield chunk
+            failed = False
+        finally:
+            self.finish(trace, "".join(parts), failed=failed)
+
+    def _spill(self, trace: RequestTrace):
+        line = json.dumps(asdict(trace), ensure_ascii=False) + "\n"
+        try:
+            with self._lock, gzip.open(self.spill_path, "at", encoding="utf-8") as f:
+                f.write(line)
+        except OSError as e:
+            print(f"Failed to spill request trace: {e}")
+
+
+def load_trace_store(session: Optional[str] = None) -> TraceStore:
+    """Build a trace store using the optional `[traces]` section of the secrets."""
+    settings = st.secrets.get("traces", {})
+
+    return TraceStore(
+        capacity=int(settings.get("capacity", 50)),
+        sample_rate=float(settings.get("sample_rate", 1.0)),
+        max_payload_chars=int(settings.get("max_payload_chars", 4000)),
+        spill_path=settings.get("spill_path") or None,
+        session=session,
+    )
@@ -0,0 +1,399 @@
+"""
+Precompiled binary bundle of the corpus, for a fast cold start.
+
+The JSON files of the law, intro, mappings and Q&A are compiled into a single
+memory-mapped file: one table of UTF-8 strings, int32 arrays with the
+begin/end paragraph of every element, the parent links of the articles and the
+mappings as adjacency lists. Opening it parses only a small header, and the
+records of the law are decoded the first time they are read.
+
+The bundle stores the signature (names, sizes and mtimes) of the JSON files it
+was built from; when they change it is considered stale and the JSON files are
+read instead until the bundle is rebuilt.
+
+Build it from the repository root:
+    python -m corpus.bundle
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import time
+from collections.abc import Mapping, Sequence
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import streamlit as st
+
+from corpus.store import Corpus, build_corpus, corpus_dirs, corpus_signature
+
+
+MAGIC = b"LCBUNDLE"
+# Increase whenever the layout changes, so that old bundles are rebuilt
+BUNDLE_VERSION = 1
+ALIGNMENT = 8
+
+# Elements of the law delimited by a range of paragraphs
+RANGE_TABLES = (
+    "books",
+    "titles",
+    "chapters",
+    "sections",
+    "articles",
+    "provisions_blocks",
+    "provisions",
+)
+TEXT_TABLES = ("paragraphs", "preamble")
+# Files of the law directory that Bundle.law_json returns
+LAW_TABLES = RANGE_TABLES + TEXT_TABLES
+# Parents of every article, as rows of these tables (-1 if none)
+ARTICLE_PARENTS = ("books", "titles", "chapters", "sections")
+QA_FIELDS = ("level", "source_id", "question", "answer")
+
+
+def default_bundle_path() -> str:
+    return st.secrets["dirs"].get("bundle", "./data/corpus.bundle")
+
+
+class _StringTableBuilder:
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.strings: List[bytes] = []
+
+    def add(self, text: str) -> int:
+        if text not in self.index:
+            self.index[text] = len(self.strings)
+            self.strings.append(text.encode("utf-8"))
+        return self.index[text]
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        offsets = np.zeros(len(self.strings) + 1, dtype=np.int64)
+        np.cumsum([len(s) for s in self.strings], out=offsets[1:])
+        data = np.frombuffer(b"".join(self.strings), dtype=np.uint8)
+        return data, offsets
+
+
+def build_bundle(corpus: Corpus, path: str):
+    """Write a bundle with the contents of a corpus loaded from JSON."""
+    strings = _StringTableBuilder()
+    arrays: Dict[str, np.ndarray] = {}
+    project = corpus.project
+
+    def ids(values) -> np.ndarray:
+        return np.array([strings.add(str(v)) for v in values], dtype=np.int32)
+
+    rows = {}
+    for table in RANGE_TABLES:
+        records = project[table]
+        rows[table] = {key: row for row, key in enumerate(records)}
+        arrays[f"{table}.keys"] = ids(records.keys())
+        arrays[f"{table}.begin"] = np.array([int(r["begin"]) for r in records.values()], dtype=np.int32)
+        arrays[f"{table}.end"] = np.array([int(r["end"]) for r in records.values()], dtype=np.int32)
+        if table != "articles":
+            arrays[f"{table}.titles"] = ids(r["title"] for r in records.values())
+
+    # The articles keep their own name; their "title" is the id of their title
+    arrays["articles.titles"] = ids(project["article_titles"][key] for key in project["articles"])
+    for parent in ARTICLE_PARENTS:
+        field = parent[:-1]
+        links = []
+        for article in project["articles"].values():
+            value = article[field]
+            if value is None:
+                links.append(-1)
+            elif parent == "books":
+                # rebuild_articles_dict stores the book as its id + 1
+                links.append(rows["books"][str(value - 1)])
+            else:
+                links.append(rows[parent][value])
+        arrays[f"articles.parent.{parent}"] = np.array(links, dtype=np.int32)
+
+    for table in TEXT_TABLES:
+        arrays[f"{table}.keys"] = ids(project[table].keys())
+        arrays[f"{table}.values"] = ids(project[table].values())
+
+    intro_tables = list(corpus.intro)
+    for table in intro_tables:
+        arrays[f"intro.{table}.keys"] = ids(corpus.intro[table].keys())
+        arrays[f"intro.{table}.values"] = ids(corpus.intro[table].values())
+
+    # Aliases point to the same arrays as the files they come from
+    aliases = {}
+    mapping_tables = []
+    seen: Dict[int, str] = {}
+    for name, mapping in corpus.mappings.items():
+        if id(mapping) in seen:
+            aliases[name] = seen[id(mapping)]
+            continue
+        seen[id(mapping)] = name
+        mapping_tables.append(name)
+        arrays[f"mappings.{name}.keys"] = ids(mapping.keys())
+        arrays[f"mappings.{name}.indptr"] = np.cumsum(
+            [0] + [len(targets) for targets in mapping.values()], dtype=np.int32
+        )
+        arrays[f"mappings.{name}.targets"] = ids(
+            target for targets in mapping.values() for target in targets
+        )
+
+    for field in QA_FIELDS:
+        arrays[f"qa.{field}"] = ids(pair[field] for pair in corpus.qa)
+
+    arrays["strings.data"], arrays["strings.offsets"] = strings.arrays()
+
+    sections = {}
+    offset = 0
+    for name, array in arrays.items():
+        sections[name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+    header = json.dumps({
+        "signature": corpus.signature,
+        "built_at": time.time(),
+        "sections": sections,
+        "intro_tables": intro_tables,
+        "mapping_tables": mapping_tables,
+        "mapping_aliases": aliases,
+    }).encode("utf-8")
+    header += b" " * (-(len(MAGIC) + 8 + len(header)) % ALIGNMENT)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp = f"{path}.tmp"
+    with open(temp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<II", BUNDLE_VERSION, len(header)))
+        f.write(header)
+        for array in arrays.values():
+            data = array.tobytes()
+            f.write(data)
+            f.write(b"\0" * (-len(data) % ALIGNMENT))
+    os.replace(temp, path)
+
+
+class _TextTable(Mapping):
+    """Read-only dict of id -> text over two columns of string ids."""
+
+    def __init__(self, bundle: "Bundle", keys: np.ndarray, values: np.ndarray):
+        self._bundle = bundle
+        self._keys = keys
+        self._values = values
+        self._rows: Optional[Dict[str, int]] = None
+
+    def _row_index(self) -> Dict[str, int]:
+        # Keys are decoded once, in row order
+        if self._rows is None:
+            self._rows = {self._bundle.string(k): row for row, k in enumerate(self._keys)}
+        return self._rows
+
+    def row(self, key: str) -> int:
+        return self._row_index()[key]
+
+    def __getitem__(self, key: str) -> str:
+        return self._bundle.string(self._values[self.row(key)])
+
+    def __contains__(self, key: object) -> bool:
+        try:
+            self.row(key)
+            return True
+        except (KeyError, TypeError):
+            return False
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._row_index())
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+class _RangeTable(_TextTable):
+    """Read-only dict of id -> {"title", "begin", "end"}, plus the parents of articles."""
+
+    def __init__(self, bundle: "Bundle", table: str, parents: bool = False):
+        super().__init__(bundle, bundle.array(f"{table}.keys"), bundle.array(f"{table}.titles"))
+        self._begin = bundle.array(f"{table}.begin")
+        self._end = bundle.array(f"{table}.end")
+        self._parents = parents
+        # Records decoded so far, shared like the dicts of a corpus read from JSON
+        self._records: List[Optional[Dict[str, Any]]] = [None] * len(self._keys)
+
+    def record(self, row: int, raw: bool = False) -> Dict[str, Any]:
+        if not raw and self._records[row] is not None:
+            return self._records[row]
+        record = {
+            "title": self._bundle.string(self._values[row]),
+            "begin": int(self._begin[row]),
+            "end": int(self._end[row]),
+        }
+        if self._parents and not raw:
+            # Same fields as rebuild_articles_dict
+            record.update(self._bundle.article_parents(row))
+        if not raw:
+            self._records[row] = record
+        return record
+
+    def __getitem__(self, key: str) -> Dict[str, Any]:
+        return self.record(self.row(key))
+
+
+class _Adjacency(_TextTable):
+    """Read-only dict of id -> list of related ids."""
+
+    def __init__(self, bundle: "Bundle", name: str):
+        super().__init__(bundle, bundle.array(f"mappings.{name}.keys"), None)
+        self._indptr = bundle.array(f"mappings.{name}.indptr")
+        self._targets = bundle.array(f"mappings.{name}.targets")
+
+    def __getitem__(self, key: str) -> List[str]:
+        row = self.row(key)
+        return [
+            self._bundle.string(t)
+            for t in self._targets[self._indptr[row]:self._indptr[row + 1]]
+        ]
+
+
+class _QATable(Sequence):
+    def __init__(self, bundle: "Bundle"):
+        self._bundle = bundle
+        self._fields = {field: bundle.array(f"qa.{field}") for field in QA_FIELDS}
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return {field: self._bundle.string(column[index]) for field, column in self._fields.items()}
+
+    def __len__(self) -> int:
+        return len(self._fields["level"])
+
+
+class Bundle:
+    """A memory-mapped corpus bundle."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a corpus bundle")
+        self.version, header_size = struct.unpack_from("<II", self._mmap, len(MAGIC))
+        if self.version != BUNDLE_VERSION:
+            raise ValueError(f"{path} has version {self.version}, expected {BUNDLE_VERSION}")
+
+        start = len(MAGIC) + 8
+        self.header = json.loads(self._mmap[start:start + header_size])
+        self.signature: str = self.header["signature"]
+        self._data_start = start + header_size
+
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._tables: Dict[str, _RangeTable] = {}
+        self._string_start = self._data_start + self.header["sections"]["strings.data"]["offset"]
+        self._string_offsets = self.array("strings.offsets")
+
+    def array(self, name: str) -> np.ndarray:
+        """A section of the bundle, as a read-only array over the mapped file."""
+        if name not in self._arrays:
+            section = self.header["sections"][name]
+            self._arrays[name] = np.frombuffer(
+                self._mmap,
+                dtype=np.dtype(section["dtype"]),
+                count=int(np.prod(section["shape"])),
+                offset=self._data_start + section["offset"],
+            ).reshape(section["shape"])
+        return self._arrays[name]
+
+    def string(self, index: int) -> str:
+        begin = self._string_start + int(self._string_offsets[index])
+        end = self._string_start + int(self._string_offsets[index + 1])
+        return self._mmap[begin:end].decode("utf-8")
+
+    def _table(self, name: str) -> _RangeTable:
+        if name not in self._tables:
+            self._tables[name] = _RangeTable(self, name, parents=name == "articles")
+        return self._tables[name]
+
+    def article_parents(self, row: int) -> Dict[str, Any]:
+        parents = {}
+        for parent in ARTICLE_PARENTS:
+            link = int(self.array(f"articles.parent.{parent}")[row])
+            key = None if link < 0 else self.string(self._table(parent)._keys[link])
+            if parent == "books" and key is not None:
+                # rebuild_articles_dict stores the book as its id + 1
+                key = int(key) + 1
+            parents[parent[:-1]] = key
+        return parents
+
+    def law_json(self, name: str) -> Dict[str, Any]:
+        """A law file as it is in JSON (e.g. 'articles' with their own names)."""
+        if name in TEXT_TABLES:
+            return dict(self._text_table(name))
+        table = self._table(name)
+        return {key: table.record(row, raw=True) for row, key in enumerate(table)}
+
+    def _text_table(self, name: str) -> _TextTable:
+        return _TextTable(self, self.array(f"{name}.keys"), self.array(f"{name}.values"))
+
+    def corpus(self) -> Corpus:
+        project: Dict[str, Any] = {name: self._table(name) for name in RANGE_TABLES}
+        project.update({name: self._text_table(name) for name in TEXT_TABLES})
+        project["article_titles"] = _TextTable(
+            self, self.array("articles.keys"), self.array("articles.titles")
+        )
+
+        intro = {
+            name: _TextTable(self, self.array(f"intro.{name}.keys"), self.array(f"intro.{name}.values"))
+            for name in self.header["intro_tables"]
+        }
+        mappings: Dict[str, Any] = {
+            name: _Adjacency(self, name) for name in self.header["mapping_tables"]
+        }
+        for alias, name in self.header["mapping_aliases"].items():
+            mappings[alias] = mappings[name]
+
+        return Corpus(
+            signature=self.signature,
+            project=MappingProxyType(project),
+            intro=MappingProxyType(intro),
+            mappings=MappingProxyType(mappings),
+            qa=_QATable(self),
+        )
+
+
+def open_bundle(path: Optional[str] = None, signature: Optional[str] = None) -> Optional[Bundle]:
+    """
+    Open the bundle if it exists and was built from the current JSON files.
+    Returns None otherwise, so callers fall back to the JSON files.
+    """
+    path = path or default_bundle_path()
+    if not os.path.exists(path):
+        return None
+    if signature is None:
+        signature = corpus_signature(corpus_dirs())
+
+    try:
+        bundle = Bundle(path)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring corpus bundle: {e}")
+        return None
+
+    if bundle.signature != signature:
+        print(f"Corpus bundle {path} is stale, reading the JSON files (rebuild it with python -m corpus.bundle)")
+        return None
+    return bundle
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=None, help="Bundle path (default: dirs.bundle of the secrets)")
+    args = parser.parse_args()
+    path = args.output or default_bundle_path()
+
+    start = time.perf_counter()
+    dirs = corpus_dirs()
+    build_bundle(build_corpus(*dirs, signature=corpus_signature(dirs)), path)
+    print(f"Built {path} ({os.path.getsize(path) / 1e6:.1f} MB) in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
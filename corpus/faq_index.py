@@ -0,0 +1,235 @@
+"""
+Inverted index of the questions and answers of the corpus, for the FAQ page.
+Terms are folded (lowercase, without accents) so "vacación" finds
+"vacaciones" and "Vacacion". Every pair also keeps the book, title, chapter
+and section containing the element it was generated from, so results can be
+filtered through the hierarchy. The index is saved next to the corpus bundle
+and rebuilt only when the corpus changes.
+"""
+
+import os
+import re
+import unicodedata
+from typing import Dict, List, Mapping, Optional
+
+import numpy as np
+import streamlit as st
+
+from corpus.navigation import NavTree, get_nav_tree
+from corpus.store import Corpus, get_corpus
+
+
+# Level of a Q&A pair -> kind of the navigation node it refers to
+QA_KINDS = {
+    "books": "book",
+    "titles": "title",
+    "chapters": "chapter",
+    "sections": "section",
+    "articles": "art",
+}
+FILTER_KINDS = ("book", "title", "chapter", "section")
+
+# Words too frequent to help finding a question
+STOPWORDS = frozenset(
+    """
+    a al algo como con cual cuales cuando de del donde el en entre es esta este
+    estos esto la las le les lo los mas o para pero por que se segun ser si sin
+    sobre su sus un una uno unos y ya
+    """.split()
+)
+
+# Weight of the terms of the question over those of the answer
+QUESTION_WEIGHT = 2.0
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Shorter query words only match whole terms, longer ones also their prefixes
+MIN_PREFIX = 3
+
+
+def fold(text: str) -> str:
+    """Lowercase text without accents or other diacritics."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> List[str]:
+    return [
+        token
+        for token in re.findall(r"\w+", fold(text))
+        if token not in STOPWORDS and len(token) > 1
+    ]
+
+
+def default_faq_index_path() -> str:
+    return st.secrets["dirs"].get("faq_index", "./data/faq_index.npz")
+
+
+class FaqIndex:
+    def __init__(self, arrays: Mapping[str, np.ndarray]):
+        self.signature = str(arrays["signature"])
+        # Sorted terms, and the postings of each one in docs/weights[indptr[i]:indptr[i + 1]]
+        self.terms = arrays["terms"]
+        self.indptr = arrays["indptr"]
+        self.docs = arrays["docs"]
+        self.weights = arrays["weights"]
+        self.lengths = arrays["lengths"]
+        # Position of every pair when listed without a query
+        self.order = arrays["order"]
+        # Id of the book, title, ... containing every pair, -1 if none
+        self.ancestors = {kind: arrays[kind] for kind in FILTER_KINDS}
+        self.size = len(self.lengths)
+        self.average_length = float(self.lengths.mean()) if self.size else 0.0
+
+    @classmethod
+    def build(cls, corpus: Corpus, nav: NavTree) -> "FaqIndex":
+        """Index the Q&A pairs of a corpus, in the order of corpus.qa."""
+        postings: Dict[str, Dict[int, float]] = {}
+        lengths = np.zeros(len(corpus.qa), dtype=np.float32)
+        ancestors = {kind: np.full(len(corpus.qa), -1, dtype=np.int32) for kind in FILTER_KINDS}
+        begins = np.zeros(len(corpus.qa), dtype=np.int64)
+        depths = np.zeros(len(corpus.qa), dtype=np.int64)
+        tables = {kind: table for table, kind in QA_KINDS.items()}
+
+        for doc, pair in enumerate(corpus.qa):
+            for weight, text in ((QUESTION_WEIGHT, pair["question"]), (1.0, pair["answer"])):
+                tokens = tokenize(text)
+                lengths[doc] += weight * len(tokens)
+                for token in tokens:
+                    term = postings.setdefault(token, {})
+                    term[doc] = term.get(doc, 0.0) + weight
+
+            kind = QA_KINDS.get(pair["level"])
+            node = (kind, pair["source_id"])
+            for ancestor_kind, (_, id) in nav.ancestors(node).items():
+                if ancestor_kind in ancestors:
+                    ancestors[ancestor_kind][doc] = int(id)
+            if kind is not None and pair["source_id"] in corpus.project[tables[kind]]:
+                begins[doc] = int(corpus.project[tables[kind]][pair["source_id"]]["begin"])
+                depths[doc] = list(QA_KINDS).index(pair["level"])
+
+        terms = sorted(postings)
+        counts = [len(postings[term]) for term in terms]
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+
+        return cls(
+            {
+                "signature": np.array(corpus.signature),
+                "terms": np.array(terms, dtype=str),
+                "indptr": indptr,
+                "docs": np.array(
+                    [doc for term in terms for doc in postings[term]], dtype=np.int32
+                ),
+                "weights": np.array(
+                    [w for term in terms for w in postings[term].values()], dtype=np.float32
+                ),
+                "lengths": lengths,
+                # Document order: by the first paragraph, a book before its titles and so on
+                "order": np.lexsort((depths, begins)).astype(np.int32),
+                **ancestors,
+            }
+        )
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temp = f"{path}.tmp"
+        with open(temp, "wb") as f:
+            np.savez(
+                f,
+                signature=np.array(self.signature),
+                terms=self.terms,
+                indptr=self.indptr,
+                docs=self.docs,
+                weights=self.weights,
+                lengths=self.lengths,
+                order=self.order,
+                **self.ancestors,
+            )
+        os.replace(temp, path)
+
+    @classmethod
+    def load(cls, path: str, signature: str) -> Optional["FaqIndex"]:
+        """The saved index, or None if missing or built from other files."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {name: data[name] for name in data.files}
+            index = cls(arrays)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring FAQ index {path}: {e}")
+            return None
+        if index.signature != signature:
+            return None
+        return index
+
+    def _matches(self, token: str) -> slice:
+        # Terms equal to the token, or starting with it if it is long enough
+        start = int(np.searchsorted(self.terms, token, side="left"))
+        if len(token) >= MIN_PREFIX:
+            stop = int(np.searchsorted(self.terms, token + "\uffff", side="left"))
+        else:
+            stop = start + int(start < len(self.terms) and self.terms[start] == token)
+        return slice(start, stop)
+
+    def search(
+        self,
+        query: str = "",
+        book: Optional[str] = None,
+        title: Optional[str] = None,
+        chapter: Optional[str] = None,
+        section: Optional[str] = None,
+    ) -> np.ndarray:
+        """
+        Positions in corpus.qa of the pairs matching a query and the filters,
+        best first. Every word must match; if no pair has them all, pairs with
+        any of them are returned. Without words, every pair in document order.
+        """
+        mask = np.ones(self.size, dtype=bool)
+        for kind, id in zip(FILTER_KINDS, (book, title, chapter, section)):
+            if id is not None:
+                mask &= self.ancestors[kind] == int(id)
+
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return self.order[mask[self.order]]
+
+        scores = np.zeros(self.size, dtype=np.float32)
+        matched = np.zeros(self.size, dtype=np.int32)
+        norm = K1 * (1 - B + B * self.lengths / max(self.average_length, 1e-9))
+        for token in tokens:
+            terms = self._matches(token)
+            found = np.zeros(self.size, dtype=bool)
+            for term in range(terms.start, terms.stop):
+                postings = slice(self.indptr[term], self.indptr[term + 1])
+                docs, tf = self.docs[postings], self.weights[postings]
+                idf = np.log(1 + (self.size - len(docs) + 0.5) / (len(docs) + 0.5))
+                scores[docs] += idf * tf * (K1 + 1) / (tf + norm[docs])
+                found[docs] = True
+            matched += found
+
+        every = mask & (matched == len(tokens))
+        candidates = np.flatnonzero(every if every.any() else mask & (matched > 0))
+        # Best score first, document order between equal scores
+        rank = np.empty(self.size, dtype=np.int64)
+        rank[self.order] = np.arange(self.size)
+        return candidates[np.lexsort((rank[candidates], -scores[candidates]))]
+
+
+@st.cache_resource(max_entries=1, show_spinner="Preparando las preguntas frecuentes...")
+def _load_faq_index(signature: str) -> FaqIndex:
+    path = default_faq_index_path()
+    index = FaqIndex.load(path, signature)
+    if index is None:
+        index = FaqIndex.build(get_corpus(), get_nav_tree())
+        try:
+            index.save(path)
+        except OSError as e:
+            print(f"Failed to save the FAQ index to {path}: {e}")
+    return index
+
+
+def get_faq_index() -> FaqIndex:
+    """Index of the current corpus's Q&A pairs, shared by every session."""
+    return _load_faq_index(get_corpus().signature)
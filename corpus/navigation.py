@@ -0,0 +1,162 @@
+"""
+Navigation tree of the law, computed once per corpus.
+Nodes are (kind, id) pairs, the same ones the Anteproyecto page keeps in
+`st.session_state.text_block`. Children, ancestors and previous/next blocks in
+document order are all precomputed, so navigating is a dictionary lookup and
+follows the structure of the JSON files instead of fixed numbers.
+"""
+
+from bisect import bisect_right
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import streamlit as st
+
+from corpus.store import get_corpus
+
+
+Node = Tuple[str, Optional[str]]
+
+PREAMBLE: Node = ("pre", None)
+# Blocks of text shown by the page, in document order
+TEXT_KINDS = ("pre", "art", "pro")
+
+# Levels from the outermost to the innermost, with the table holding them
+LAW_LEVELS = (
+    ("book", "books"),
+    ("title", "titles"),
+    ("chapter", "chapters"),
+    ("section", "sections"),
+    ("art", "articles"),
+)
+PROVISION_LEVELS = (
+    ("pblock", "provisions_blocks"),
+    ("pro", "provisions"),
+)
+
+
+class NavTree:
+    def __init__(self, project: Mapping):
+        self.labels: Dict[Node, str] = {PREAMBLE: "Preámbulo"}
+        self.parents: Dict[Node, Optional[Node]] = {PREAMBLE: None}
+        self._children: Dict[Optional[Node], List[Node]] = {None: []}
+        self._ancestors: Dict[Node, Dict[str, Node]] = {PREAMBLE: {}}
+
+        begins: List[Tuple[int, Node]] = []
+        for levels in (LAW_LEVELS, PROVISION_LEVELS):
+            enclosing: List[Tuple[List[int], List[int], List[Node]]] = []
+            for kind, table in levels:
+                records = sorted(
+                    project[table].items(), key=lambda item: int(item[1]["begin"])
+                )
+                level_begins, level_ends, level_nodes = [], [], []
+
+                for id, record in records:
+                    node = (kind, id)
+                    begin, end = int(record["begin"]), int(record["end"])
+                    if kind == "art":
+                        self.labels[node] = project["article_titles"][id]
+                    else:
+                        self.labels[node] = record["title"]
+
+                    # The parent is the innermost element of an outer level containing the node
+                    parent = None
+                    ancestors: Dict[str, Node] = {}
+                    for outer_begins, outer_ends, outer_nodes in reversed(enclosing):
+                        i = bisect_right(outer_begins, begin) - 1
+                        if i >= 0 and end <= outer_ends[i]:
+                            outer = outer_nodes[i]
+                            parent = parent or outer
+                            ancestors[outer[0]] = outer
+                    ancestors[kind] = node
+
+                    self.parents[node] = parent
+                    self._ancestors[node] = ancestors
+                    self._children.setdefault(parent, []).append(node)
+                    level_begins.append(begin)
+                    level_ends.append(end)
+                    level_nodes.append(node)
+                    if kind in TEXT_KINDS:
+                        begins.append((begin, node))
+
+                enclosing.append((level_begins, level_ends, level_nodes))
+
+        # The preamble comes before every element of the law
+        self._children[None].insert(0, PREAMBLE)
+        self.sequence: List[Node] = [PREAMBLE] + [node for _, node in sorted(begins)]
+        self._position = {node: i for i, node in enumerate(self.sequence)}
+
+        # Paragraph ranges of the articles and provisions, to locate a paragraph
+        blocks = sorted(
+            (int(project[table][id]["begin"]), int(project[table][id]["end"]), (kind, id))
+            for kind, table in (("art", "articles"), ("pro", "provisions"))
+            for id in project[table]
+        )
+        self._block_begins = [begin for begin, _, _ in blocks]
+        self._block_ends = [end for _, end, _ in blocks]
+        self._blocks = [node for _, _, node in blocks]
+
+    def label(self, node: Node) -> str:
+        return self.labels[node]
+
+    def top_level(self) -> List[Node]:
+        """Preamble, books and blocks of provisions, in document order."""
+        return self._children[None]
+
+    def children(self, node: Node, kind: Optional[str] = None) -> List[Node]:
+        """Direct children of a node, optionally only those of a kind."""
+        children = self._children.get(node, [])
+        if kind is None:
+            return children
+        return [child for child in children if child[0] == kind]
+
+    def ancestors(self, node: Node) -> Dict[str, Node]:
+        """The node and its ancestors, by kind ('book', 'title', ..., 'art', 'pblock', 'pro')."""
+        return self._ancestors.get(node, {})
+
+    def top(self, node: Node) -> Node:
+        """The top-level node containing a node (the node itself for the preamble)."""
+        while self.parents.get(node) is not None:
+            node = self.parents[node]
+        return node
+
+    def path(self, node: Node) -> List[Node]:
+        """Nodes from the top level down to the node, for breadcrumbs."""
+        path = [node]
+        while self.parents.get(path[-1]) is not None:
+            path.append(self.parents[path[-1]])
+        return path[::-1]
+
+    def locate(self, paragraph_id: str) -> List[Node]:
+        """Nodes containing a paragraph, from the top level down to its article or provision."""
+        try:
+            paragraph = int(paragraph_id)
+        except ValueError:
+            return []
+        i = bisect_right(self._block_begins, paragraph) - 1
+        if i < 0 or paragraph > self._block_ends[i]:
+            return []
+        return self.path(self._blocks[i])
+
+    def previous(self, node: Node) -> Optional[Node]:
+        """The block of text before a block, in document order."""
+        position = self._position.get(node)
+        if not position:
+            return None
+        return self.sequence[position - 1]
+
+    def next(self, node: Node) -> Optional[Node]:
+        """The block of text after a block, in document order."""
+        position = self._position.get(node)
+        if position is None or position + 1 >= len(self.sequence):
+            return None
+        return self.sequence[position + 1]
+
+
+@st.cache_resource(max_entries=1)
+def _build_nav_tree(corpus_signature: str) -> NavTree:
+    return NavTree(get_corpus().project)
+
+
+def get_nav_tree() -> NavTree:
+    """Navigation tree of the current corpus, shared by every session."""
+    return _build_nav_tree(get_corpus().signature)
@@ -0,0 +1,204 @@
+"""
+Process-wide, read-only corpus: the law, the introduction, the mappings and
+the questions and answers. Built once and shared by every session, and
+rebuilt only when the modification time of one of its JSON files changes.
+It is loaded from the binary bundle (see corpus.bundle) when it is up to
+date, and from the JSON files otherwise. Its text is also kept in a single
+buffer (see corpus.text) for reading whole articles and ranges.
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Sequence
+
+import streamlit as st
+
+from corpus.text import CorpusTextStore
+
+
+def load_json_files_from_directory(directory_path):
+    json_dict = {}
+    # Listar todos los ficheros en el directorio
+    for filename in os.listdir(directory_path):
+        # Comprobar que es un fichero JSON
+        if filename.endswith(".json"):
+            full_path = os.path.join(directory_path, filename)
+            with open(full_path, "r", encoding="utf-8") as f:
+                content = json.load(f)
+                name_without_extension = os.path.splitext(filename)[0]
+                json_dict[name_without_extension] = content
+    return json_dict
+
+
+# Q&A files and the law structure file each one refers to
+QA_LEVELS = {
+    "articles": "articles_questions.json",
+    "chapters": "chapters_questions.json",
+    "sections": "sections_questions.json",
+    "titles": "titles_questions.json",
+    "books": "books_questions.json",
+}
+
+
+def load_qa_pairs(qa_path: str) -> List[Dict[str, str]]:
+    """
+    Load every question/answer pair from the questions-and-answers directory.
+
+    Returns:
+        List of pairs with their level ('articles', 'chapters', ...) and the id of
+        the element of that level they were generated from
+    """
+    pairs = []
+    for level, filename in QA_LEVELS.items():
+        file_path = os.path.join(qa_path, filename)
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Failed to load {filename}: {e}")
+            continue
+
+        for source_id, items in data.items():
+            for item in items:
+                pairs.append({
+                    'level': level,
+                    'source_id': source_id,
+                    'question': item['question'],
+                    'answer': item['answer'],
+                })
+    return pairs
+
+
+def rebuild_articles_dict(all):
+    for art in all["articles"].values():
+        apb = int(art["begin"])
+        ape = int(art["end"])
+        art["book"] = None
+        for idb, book in all["books"].items():
+            if int(book["begin"]) <= apb and ape <= int(book["end"]):
+                art["book"] = int(idb) + 1
+                break
+        art["title"] = None
+        for idt, title in all["titles"].items():
+            if int(title["begin"]) <= apb and ape <= int(title["end"]):
+                art["title"] = idt
+                break
+        art["chapter"] = None
+        for idc, chapter in all["chapters"].items():
+            if int(chapter["begin"]) <= apb and ape <= int(chapter["end"]):
+                art["chapter"] = idc
+                break
+        art["section"] = None
+        for ids, section in all["sections"].items():
+            if int(section["begin"]) <= apb and ape <= int(section["end"]):
+                art["section"] = ids
+                break
+
+
+def rebuild_simple_mapping(items):
+    res = {}
+    for item in items["pairs"]:
+        current = item["Project_Law"]
+        rids = [i["id"] for i in item["Actual_Law"]]
+        res[current["id"]] = rids
+    return res
+
+
+@dataclass(frozen=True)
+class Corpus:
+    """
+    Shared by every session: its contents must never be modified.
+    The top-level mappings are read-only views to catch accidental writes.
+    """
+
+    signature: str
+    project: Mapping[str, Any]
+    intro: Mapping[str, Any]
+    # Project element id -> related ids, for every "pairs" mapping file
+    # plus the "policies" and "diagnosis" aliases
+    mappings: Mapping[str, Mapping[str, List[str]]]
+    qa: Sequence[Mapping[str, str]]
+
+
+def corpus_dirs() -> List[str]:
+    """Law, intro, mappings and Q&A directories, in the order build_corpus takes them."""
+    dirs = st.secrets["dirs"]
+    return [
+        dirs["project"]["law"],
+        dirs["project"]["intro"],
+        dirs["mappings"],
+        dirs.get("qa", "./questions-and-answers"),
+    ]
+
+
+def corpus_signature(directories: List[str]) -> str:
+    """Names, sizes and modification times of the JSON files, cheap to compute on every rerun."""
+    signature = []
+    for directory in directories:
+        try:
+            for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    signature.append(
+                        f"{entry.path}:{stat.st_size}:{stat.st_mtime_ns}"
+                    )
+        except OSError as e:
+            print(f"Failed to read corpus directory {directory}: {e}")
+    return "|".join(signature)
+
+
+def build_corpus(
+    law_dir: str, intro_dir: str, mappings_dir: str, qa_dir: str, signature: str = ""
+) -> Corpus:
+    """Parse the corpus from its JSON files."""
+    project = load_json_files_from_directory(law_dir)
+    # rebuild_articles_dict replaces the name of each article with its title id
+    project["article_titles"] = {
+        aid: art["title"] for aid, art in project["articles"].items()
+    }
+    rebuild_articles_dict(project)
+    intro = load_json_files_from_directory(intro_dir)
+
+    mappings: Dict[str, Any] = {
+        name: rebuild_simple_mapping(content)
+        for name, content in load_json_files_from_directory(mappings_dir).items()
+        if isinstance(content, dict) and "pairs" in content
+    }
+    mappings["policies"] = mappings["politicas_vs_articulo"]
+    mappings["diagnosis"] = mappings["diagnostico_vs_articulo"]
+
+    return Corpus(
+        signature=signature,
+        project=MappingProxyType(project),
+        intro=MappingProxyType(intro),
+        mappings=MappingProxyType(mappings),
+        qa=tuple(load_qa_pairs(qa_dir)),
+    )
+
+
+@st.cache_resource(max_entries=1, show_spinner="Cargando el anteproyecto...")
+def _load_corpus(signature: str) -> Corpus:
+    # Imported here: the bundle module builds on this one
+    from corpus.bundle import open_bundle
+
+    bundle = open_bundle(signature=signature)
+    if bundle is not None:
+        return bundle.corpus()
+    return build_corpus(*corpus_dirs(), signature=signature)
+
+
+def get_corpus() -> Corpus:
+    """The current corpus, rebuilt only when its files change."""
+    return _load_corpus(corpus_signature(corpus_dirs()))
+
+
+@st.cache_resource(max_entries=1)
+def _build_text_store(signature: str) -> CorpusTextStore:
+    return CorpusTextStore.from_project(get_corpus().project)
+
+
+def get_text_store() -> CorpusTextStore:
+    """Text of the current corpus's law, shared by every session."""
+    return _build_text_store(get_corpus().signature)
@@ -0,0 +1,151 @@
+"""
+Text of a law (the draft or the current one) in a single contiguous buffer.
+The paragraphs are stored in document order as UTF-8, each followed by a
+newline, with an array of offsets, so the text of any range of paragraphs,
+article or provision is one slice of the buffer instead of a loop of
+dictionary lookups. Views of the buffer are zero-copy; decoding a slice is
+the only copy made to get a str.
+
+Independent of Streamlit, for the preprocessing scripts: the app gets the
+store of its corpus with corpus.store.get_text_store().
+"""
+
+import json
+import os
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+
+# Tables of elements made of a range of paragraphs, loaded when present
+BLOCK_TABLES = ("articles", "provisions")
+
+
+class CorpusTextStore:
+    def __init__(
+        self,
+        paragraphs: Mapping[str, str],
+        blocks: Optional[Mapping[str, Mapping[str, Mapping]]] = None,
+    ):
+        """
+        Args:
+            paragraphs: Paragraph id -> text, ids being numbers in document order
+            blocks: Table name ('articles', 'provisions') -> id -> record with
+                the 'begin' and 'end' paragraph ids (both included)
+        """
+        ids = sorted(paragraphs, key=int)
+        encoded = [paragraphs[id].encode("utf-8") + b"\n" for id in ids]
+
+        self.ids = np.array([int(id) for id in ids], dtype=np.int64)
+        self.offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum([len(text) for text in encoded], out=self.offsets[1:])
+        self.buffer = b"".join(encoded)
+        self._view = memoryview(self.buffer)
+        # A newline inside a paragraph would be taken for a separator
+        self._has_newlines = any("\n" in text for text in paragraphs.values())
+
+        # Per table: id -> row, and the paragraph positions of each row (end excluded)
+        self._blocks: Dict[str, Tuple[Dict[str, int], np.ndarray, np.ndarray]] = {}
+        for table, records in (blocks or {}).items():
+            ranges = [
+                (id, int(record["begin"]), int(record["end"]))
+                for id, record in records.items()
+                if record.get("begin") is not None and record.get("end") is not None
+            ]
+            begins = np.array([begin for _, begin, _ in ranges], dtype=np.int64)
+            ends = np.array([end for _, _, end in ranges], dtype=np.int64)
+            starts = np.searchsorted(self.ids, begins, side="left")
+            stops = np.maximum(starts, np.searchsorted(self.ids, ends, side="right"))
+            self._blocks[table] = (
+                {id: row for row, (id, _, _) in enumerate(ranges)},
+                starts,
+                stops,
+            )
+
+    @classmethod
+    def from_directory(cls, law_dir: str) -> "CorpusTextStore":
+        """Store of the law in a directory (paragraphs.json, articles.json, provisions.json)."""
+        with open(os.path.join(law_dir, "paragraphs.json"), "r", encoding="utf-8") as f:
+            paragraphs = json.load(f)
+        blocks = {}
+        for table in BLOCK_TABLES:
+            path = os.path.join(law_dir, f"{table}.json")
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    blocks[table] = json.load(f)
+        return cls(paragraphs, blocks)
+
+    @classmethod
+    def from_project(cls, project: Mapping) -> "CorpusTextStore":
+        """Store of an already loaded law (e.g. the `project` of the corpus)."""
+        return cls(
+            project["paragraphs"],
+            {table: project[table] for table in BLOCK_TABLES if table in project},
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _positions(self, begin: int, end: int) -> Tuple[int, int]:
+        # Missing ids inside the range are skipped
+        start = int(np.searchsorted(self.ids, begin, side="left"))
+        stop = int(np.searchsorted(self.ids, end, side="right"))
+        return start, max(start, stop)
+
+    def _slice(self, start: int, stop: int) -> memoryview:
+        if start >= stop:
+            return self._view[0:0]
+        # Without the newline after the last paragraph
+        return self._view[self.offsets[start] : self.offsets[stop] - 1]
+
+    def _text(self, start: int, stop: int, separator: str) -> str:
+        if separator != "\n" and self._has_newlines:
+            return separator.join(self._paragraph(i) for i in range(start, stop))
+        text = str(self._slice(start, stop), "utf-8")
+        return text if separator == "\n" else text.replace("\n", separator)
+
+    def _paragraph(self, i: int) -> str:
+        return str(self._view[self.offsets[i] : self.offsets[i + 1] - 1], "utf-8")
+
+    def _block(self, table: str, id: str) -> Tuple[int, int]:
+        rows, starts, stops = self._blocks[table]
+        row = rows[str(id)]
+        return int(starts[row]), int(stops[row])
+
+    def has_block(self, table: str, id: str) -> bool:
+        return table in self._blocks and str(id) in self._blocks[table][0]
+
+    def block_size(self, table: str, id: str) -> int:
+        """Number of paragraphs of an article or provision found in the store."""
+        start, stop = self._block(table, id)
+        return stop - start
+
+    def paragraph(self, paragraph_id: str) -> Optional[str]:
+        start, stop = self._positions(int(paragraph_id), int(paragraph_id))
+        return self._paragraph(start) if start < stop else None
+
+    def range_view(self, begin: int, end: int) -> memoryview:
+        """UTF-8 of the paragraphs begin..end (included), separated by newlines, without copying."""
+        return self._slice(*self._positions(int(begin), int(end)))
+
+    def range_text(self, begin: int, end: int, separator: str = "\n") -> str:
+        """Text of the paragraphs begin..end (included)."""
+        return self._text(*self._positions(int(begin), int(end)), separator)
+
+    def range_paragraphs(self, begin: int, end: int) -> List[Tuple[str, str]]:
+        """(id, text) of the paragraphs begin..end (included)."""
+        start, stop = self._positions(int(begin), int(end))
+        return [(str(self.ids[i]), self._paragraph(i)) for i in range(start, stop)]
+
+    def block_view(self, table: str, id: str) -> memoryview:
+        """UTF-8 of an article or provision, without copying."""
+        return self._slice(*self._block(table, id))
+
+    def block_text(self, table: str, id: str, separator: str = "\n") -> str:
+        """Text of an article ('articles') or provision ('provisions')."""
+        return self._text(*self._block(table, id), separator)
+
+    def block_paragraphs(self, table: str, id: str) -> List[Tuple[str, str]]:
+        """(id, text) of the paragraphs of an article or provision."""
+        start, stop = self._block(table, id)
+        return [(str(self.ids[i]), self._paragraph(i)) for i in range(start, stop)]
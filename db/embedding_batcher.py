@@ -0,0 +1,92 @@
+"""
+Process-wide micro-batching of query embeddings.
+Collects the single-text embedding requests of every session for a few
+milliseconds and sends them to the embedding service as one batched call.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Tuple
+
+
+class EmbeddingBatcher:
+    """Groups concurrent embedding requests into batched calls made by a background thread."""
+
+    def __init__(self, embed_batch: Callable[[List[str]], List[List[float]]],
+                 max_batch: int = 32, max_wait: float = 0.008):
+        """
+        Initialize the batcher.
+
+        Args:
+            embed_batch: Function embedding a list of texts in a single request
+            max_batch: Maximum number of texts sent in one request
+            max_wait: Seconds to wait for more texts after the first one arrives
+        """
+        self.embed_batch = embed_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.texts = 0
+        self._pending: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def embed(self, text: str) -> List[float]:
+        """Embed a text, waiting for the batch it is sent in."""
+        future: Future = Future()
+        self._pending.put((text, future))
+        return future.result()
+
+    def _collect(self) -> List[Tuple[str, Future]]:
+        batch = [self._pending.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                embeddings = self.embed_batch([text for text, _ in batch])
+                if len(embeddings) != len(batch):
+                    raise ValueError(f"{len(embeddings)} embeddings for {len(batch)} texts")
+                for (_, future), embedding in zip(batch, embeddings):
+                    future.set_result(embedding)
+            except Exception as e:
+                for _, future in batch:
+                    # Some futures may be resolved already, the thread must survive
+                    if not future.done():
+                        future.set_exception(e)
+            self.batches += 1
+            self.texts += len(batch)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch": self.texts / self.batches if self.batches else 0.0,
+        }
+
+
+_batchers: Dict[Tuple[str, str], EmbeddingBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def get_embedding_batcher(base_url: str, model: str,
+                          embed_batch: Callable[[List[str]], List[List[float]]],
+                          max_batch: int = 32, max_wait: float = 0.008) -> EmbeddingBatcher:
+    """Batcher shared by every client of the process using the same embedding service and model."""
+    with _batchers_lock:
+        key = (base_url, model)
+        if key not in _batchers:
+            _batchers[key] = EmbeddingBatcher(embed_batch, max_batch=max_batch, max_wait=max_wait)
+        return _batchers[key]
@@ -0,0 +1,145 @@
+"""
+Milvus client for the anteproy_faq collection.
+Indexes the precomputed questions and answers so that frequent questions can be
+answered without calling the LLM.
+"""
+
+import streamlit as st
+from typing import List, Dict, Any, Optional
+from pymilvus import CollectionSchema, FieldSchema, DataType
+
+from corpus.store import QA_LEVELS, load_qa_pairs
+from db.milvus_client import MilvusParagraphClient
+
+
+class MilvusFAQClient(MilvusParagraphClient):
+    """Client for the frequently asked questions stored in Milvus."""
+
+    def __init__(self, collection_name: str = "anteproy_faq",
+                 qa_path: str = st.secrets["dirs"].get("qa", "./questions-and-answers"),
+                 threshold: float = st.secrets.get("faq", {}).get("threshold", 0.92),
+                 **kwargs):
+        """
+        Initialize the FAQ client.
+
+        Args:
+            collection_name: Name of the collection to create/use
+            qa_path: Path to the questions-and-answers JSON files
+            threshold: Minimum similarity for a stored question to answer a query
+            **kwargs: Extra arguments for MilvusParagraphClient
+        """
+        self.qa_path = qa_path
+        self.threshold = threshold
+        super().__init__(collection_name=collection_name, **kwargs)
+
+    def _create_schema(self) -> CollectionSchema:
+        """Create the collection schema for questions and answers."""
+        fields = [
+            FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
+            FieldSchema(name="question", dtype=DataType.VARCHAR, max_length=1000),
+            FieldSchema(name="answer", dtype=DataType.VARCHAR, max_length=5000),
+            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=768),
+            FieldSchema(name="level", dtype=DataType.VARCHAR, max_length=20),  # "articles", "chapters", ...
+            FieldSchema(name="source_id", dtype=DataType.VARCHAR, max_length=10),
+            FieldSchema(name="citation", dtype=DataType.VARCHAR, max_length=500),
+        ]
+
+        schema = CollectionSchema(
+            fields=fields,
+            description="Collection for storing frequent questions and answers about the labor code"
+        )
+        return schema
+
+    def _get_citation(self, level: str, source_id: str, structure: Dict[str, Any]) -> str:
+        """Get the articles an element of the law spans, as a citation."""
+        articles = structure['articles']
+        if level == 'articles':
+            return f"Art. {source_id}"
+
+        block = structure[level].get(source_id)
+        if block is None:
+            return ""
+
+        inner = [
+            int(art_id) for art_id, art in articles.items()
+            if block['begin'] <= art['begin'] and art['end'] <= block['end']
+        ]
+        if not inner:
+            return block.get('title', '')
+        if min(inner) == max(inner):
+            return f"{block.get('title', '')}, Art. {min(inner)}"
+        return f"{block.get('title', '')}, Arts. {min(inner)}-{max(inner)}"
+
+    def insert_questions(self):
+        """Insert all questions and answers from the JSON files into Milvus."""
+        print("Starting FAQ insertion...")
+
+        structure = {level: self._load_json_data(f"{level}.json") for level in QA_LEVELS}
+        pairs = load_qa_pairs(self.qa_path)
+
+        # Only the questions are embedded, queries are matched against them
+        print(f"Generating embeddings for {len(pairs)} questions...")
+        embeddings = self._generate_batch_embeddings([pair['question'] for pair in pairs])
+
+        batch_size = 100
+        total_inserted = 0
+
+        for i in range(0, len(pairs), batch_size):
+            batch = pairs[i:i + batch_size]
+            batch_embeddings = embeddings[i:i + batch_size]
+
+            try:
+                insert_data = [
+                    [pair['question'] for pair in batch],
+                    [pair['answer'] for pair in batch],
+                    batch_embeddings,
+                    [pair['level'] for pair in batch],
+                    [pair['source_id'] for pair in batch],
+                    [self._get_citation(pair['level'], pair['source_id'], structure) for pair in batch],
+                ]
+
+                self.collection.insert(insert_data)
+                total_inserted += len(batch)
+                print(f"Inserted batch {i//batch_size + 1}, total: {total_inserted}")
+
+            except Exception as e:
+                print(f"Failed to insert batch {i//batch_size + 1}: {e}")
+
+        self.collection.flush()
+        print(f"Successfully inserted {total_inserted} questions")
+
+    def find_answer(self, query_embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """
+        Find the stored answer for the closest stored question.
+
+        Args:
+            query_embedding: Embedding of the user query
+
+        Returns:
+            The matching pair if its similarity reaches the threshold, None otherwise
+        """
+        try:
+            results = self.collection.search(
+                data=[query_embedding],
+                anns_field="embedding",
+                param={"metric_type": "COSINE", "params": {"nprobe": 10}},
+                limit=1,
+                output_fields=["question", "answer", "level", "source_id", "citation"]
+            )
+        except Exception as e:
+            print(f"FAQ search failed: {e}")
+            return None
+
+        for hits in results:
+            for hit in hits:
+                if hit.score < self.threshold:
+                    return None
+                return {
+                    'question': hit.entity.get('question'),
+                    'answer': hit.entity.get('answer'),
+                    'level': hit.entity.get('level'),
+                    'source_id': hit.entity.get('source_id'),
+                    'citation': hit.entity.get('citation'),
+                    'similarity_score': hit.score,
+                }
+        return None
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Offline grouping of similar feedback, so reviewers read groups of ideas
+instead of every near-duplicate one.
+Embeds the feedback not embedded yet in batches, with the embedding service
+of the paragraph client, and clusters with spherical k-means the feedback of
+every article or provision that received new ideas since the last run. Each
+cluster keeps its size, its actions and the ideas closest to its centre.
+
+Run from the repository root: python -m db.feedback_clusters
+"""
+
+import argparse
+import json
+import math
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import streamlit as st
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS feedback_embeddings (
+    feedback_id INTEGER PRIMARY KEY,
+    model TEXT NOT NULL,
+    vector BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS feedback_clusters (
+    kind TEXT NOT NULL,
+    node_id TEXT NOT NULL,
+    cluster INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    actions TEXT NOT NULL,
+    representatives TEXT NOT NULL,
+    centroid BLOB NOT NULL,
+    PRIMARY KEY (kind, node_id, cluster)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS feedback_cluster_state (
+    kind TEXT NOT NULL,
+    node_id TEXT NOT NULL,
+    last_feedback_id INTEGER NOT NULL,
+    clustered_at REAL NOT NULL,
+    PRIMARY KEY (kind, node_id)
+) WITHOUT ROWID;
+"""
+
+# Elements whose feedback is clustered (see db.feedback_store)
+CLUSTERED_KINDS = ("art", "pro")
+
+
+@dataclass
+class FeedbackCluster:
+    cluster: int
+    size: int
+    # Action -> number of ideas of the cluster
+    actions: Dict[str, int]
+    # (feedback id, text) of the ideas closest to the centre, closest first
+    representatives: List[Tuple[int, str]]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def choose_k(n: int, max_k: int) -> int:
+    """Number of clusters for n ideas: about sqrt(n / 2), at most max_k."""
+    return max(1, min(n, max_k, round(math.sqrt(n / 2))))
+
+
+def kmeans(
+    vectors: np.ndarray,
+    k: int,
+    init: Optional[np.ndarray] = None,
+    iterations: int = 50,
+    seed: int = 0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Spherical k-means (cosine similarity) over unit vectors.
+
+    Args:
+        vectors: (n, d) unit vectors
+        k: Number of clusters
+        init: Centroids to start from (those of the previous run); missing ones
+            are chosen with k-means++
+        iterations: Maximum number of iterations
+        seed: Seed of the k-means++ choices
+
+    Returns:
+        (k, d) centroids and the (n,) cluster of every vector
+    """
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    centroids = [] if init is None else list(init[:k])
+    if not centroids:
+        centroids.append(vectors[rng.integers(n)])
+    while len(centroids) < k:
+        # k-means++: far from the chosen centroids is more likely
+        distance = 1 - np.max(vectors @ np.stack(centroids).T, axis=1)
+        distance = np.clip(distance, 0, None)
+        total = distance.sum()
+        p = distance / total if total > 0 else None
+        centroids.append(vectors[rng.choice(n, p=p)])
+    centroids = np.stack(centroids)
+
+    labels = np.full(n, -1)
+    for _ in range(iterations):
+        new_labels = np.argmax(vectors @ centroids.T, axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        empty = np.bincount(labels, minlength=k) == 0
+        # An empty cluster keeps its centroid
+        sums[empty] = centroids[empty]
+        centroids = _normalize(sums)
+    return centroids, labels
+
+
+class FeedbackClusterer:
+    """Embeddings and clusters of the feedback, in the feedback database."""
+
+    def __init__(
+        self,
+        path: str,
+        embed: Optional[Callable[[List[str]], List[List[float]]]] = None,
+        model: str = "",
+        max_k: int = 30,
+        representatives: int = 3,
+    ):
+        """
+        Args:
+            path: SQLite database of the feedback store
+            embed: Function embedding a batch of texts, only needed to update
+            model: Name of the embedding model, feedback embedded with another one is embedded again
+            max_k: Maximum number of clusters of an element
+            representatives: Ideas kept as examples of each cluster
+        """
+        self.path = path
+        self.embed = embed
+        self.model = model
+        self.max_k = max_k
+        self.representatives = representatives
+        self._local = threading.local()
+
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _reader(self) -> sqlite3.Connection:
+        if not hasattr(self._local, "connection"):
+            self._local.connection = self._connect()
+        return self._local.connection
+
+    def embed_new(self, batch_size: int = 100) -> int:
+        """
+        Embed the feedback without an embedding of the current model.
+        Ideas whose embedding failed are left for the next run.
+
+        Returns:
+            Number of ideas embedded
+        """
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                """
+                SELECT f.id, f.text FROM feedback f
+                LEFT JOIN feedback_embeddings e ON e.feedback_id = f.id
+                WHERE e.feedback_id IS NULL OR e.model != ?
+                ORDER BY f.id
+                """,
+                (self.model,),
+            ).fetchall()
+
+            embedded = 0
+            for i in range(0, len(rows), batch_size):
+                batch = rows[i : i + batch_size]
+                vectors = _normalize(
+                    np.asarray(self.embed([text for _, text in batch]), dtype=np.float32)
+                )
+                # Zero vectors are the embedding client's fallback on failure
+                valid = np.linalg.norm(vectors, axis=1) > 0
+                with connection:
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO feedback_embeddings VALUES (?, ?, ?)",
+                        [
+                            (feedback_id, self.model, vector.tobytes())
+                            for (feedback_id, _), vector, ok in zip(batch, vectors, valid)
+                            if ok
+                        ],
+                    )
+                embedded += int(valid.sum())
+                print(f"Embedded {embedded}/{len(rows)} ideas")
+        finally:
+            connection.close()
+        return embedded
+
+    def changed_nodes(self, full: bool = False) -> List[Tuple[str, str, int]]:
+        """(kind, id, last feedback id) of the elements with ideas embedded since they were clustered."""
+        connection = self._reader()
+        kinds = ",".join("?" * len(CLUSTERED_KINDS))
+        latest = connection.execute(
+            f"""
+            SELECT n.kind, n.node_id, MAX(n.feedback_id) FROM feedback_nodes n
+            JOIN feedback_embeddings e ON e.feedback_id = n.feedback_id
+            WHERE n.kind IN ({kinds}) GROUP BY n.kind, n.node_id
+            """,
+            CLUSTERED_KINDS,
+        ).fetchall()
+        clustered = {
+            (kind, node_id): last
+            for kind, node_id, last in connection.execute(
+                "SELECT kind, node_id, last_feedback_id FROM feedback_cluster_state"
+            )
+        }
+        return [
+            (kind, node_id, last)
+            for kind, node_id, last in latest
+            if full or clustered.get((kind, node_id), -1) < last
+        ]
+
+    def cluster_node(self, kind: str, node_id: str, last_feedback_id: int) -> int:
+        """
+        Cluster the feedback of an element, starting from its previous centroids.
+
+        Returns:
+            Number of clusters
+        """
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                """
+                SELECT f.id, f.action, f.text, e.vector FROM feedback_nodes n
+                JOIN feedback f ON f.id = n.feedback_id
+                JOIN feedback_embeddings e ON e.feedback_id = n.feedback_id
+                WHERE n.kind = ? AND n.node_id = ? AND e.model = ?
+                ORDER BY f.id
+                """,
+                (kind, node_id, self.model),
+            ).fetchall()
+            if not rows:
+                return 0
+
+            vectors = np.stack([np.frombuffer(row[3], dtype=np.float32) for row in rows])
+            previous = [
+                np.frombuffer(centroid, dtype=np.float32)
+                for (centroid,) in connection.execute(
+                    """
+                    SELECT centroid FROM feedback_clusters
+                    WHERE kind = ? AND node_id = ? ORDER BY size DESC
+                    """,
+                    (kind, node_id),
+                )
+            ]
+            previous = [c for c in previous if c.shape == vectors.shape[1:]]
+            centroids, labels = kmeans(
+                vectors,
+                choose_k(len(rows), self.max_k),
+                init=np.stack(previous) if previous else None,
+            )
+            similarity = np.sum(vectors * centroids[labels], axis=1)
+
+            clusters = []
+            for cluster in range(len(centroids)):
+                members = np.flatnonzero(labels == cluster)
+                if len(members) == 0:
+                    continue
+                closest = members[np.argsort(-similarity[members])][: self.representatives]
+                actions: Dict[str, int] = {}
+                for i in members:
+                    actions[rows[i][1]] = actions.get(rows[i][1], 0) + 1
+                clusters.append(
+                    (
+                        len(members),
+                        json.dumps(actions),
+                        json.dumps([int(rows[i][0]) for i in closest]),
+                        centroids[cluster].astype(np.float32).tobytes(),
+                    )
+                )
+            # Largest clusters first
+            clusters.sort(key=lambda c: -c[0])
+
+            with connection:
+                connection.execute(
+                    "DELETE FROM feedback_clusters WHERE kind = ? AND node_id = ?",
+                    (kind, node_id),
+                )
+                connection.executemany(
+                    "INSERT INTO feedback_clusters VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(kind, node_id, i, *cluster) for i, cluster in enumerate(clusters)],
+                )
+                connection.execute(
+                    "INSERT OR REPLACE INTO feedback_cluster_state VALUES (?, ?, ?, ?)",
+                    (kind, node_id, last_feedback_id, time.time()),
+                )
+        finally:
+            connection.close()
+        return len(clusters)
+
+    def update(self, batch_size: int = 100, full: bool = False) -> Dict[str, int]:
+        """Embed the new feedback and cluster again the elements that received it."""
+        embedded = self.embed_new(batch_size) if self.embed is not None else 0
+        nodes = self.changed_nodes(full)
+        clusters = 0
+        for kind, node_id, last in nodes:
+            clusters += self.cluster_node(kind, node_id, last)
+        return {"embedded": embedded, "elements": len(nodes), "clusters": clusters}
+
+    def clusters(self, kind: str, node_id: str) -> List[FeedbackCluster]:
+        """Clusters of the feedback of an element, largest first."""
+        connection = self._reader()
+        rows = connection.execute(
+            """
+            SELECT cluster, size, actions, representatives FROM feedback_clusters
+            WHERE kind = ? AND node_id = ? ORDER BY cluster
+            """,
+            (kind, str(node_id)),
+        ).fetchall()
+
+        ids = [id for row in rows for id in json.loads(row[3])]
+        texts = {}
+        if ids:
+            texts = dict(
+                connection.execute(
+                    f"SELECT id, text FROM feedback WHERE id IN ({','.join('?' * len(ids))})",
+                    ids,
+                )
+            )
+
+        return [
+            FeedbackCluster(
+                cluster=cluster,
+                size=size,
+                actions=json.loads(actions),
+                representatives=[
+                    (id, texts[id]) for id in json.loads(representatives) if id in texts
+                ],
+            )
+            for cluster, size, actions, representatives in rows
+        ]
+
+
+def feedback_db_path() -> str:
+    return st.secrets["dbs"].get("feedback", "./data/feedback.db")
+
+
+@st.cache_resource
+def get_feedback_clusters() -> FeedbackClusterer:
+    """Read-only access to the clusters, for the pages."""
+    return FeedbackClusterer(feedback_db_path())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=100, help="Ideas per embedding request")
+    parser.add_argument("--max-k", type=int, default=30, help="Maximum clusters per element")
+    parser.add_argument(
+        "--full", action="store_true", help="Cluster every element again, not only those with new ideas"
+    )
+    args = parser.parse_args()
+
+    # Imported here: the page reading the clusters does not need Milvus
+    from db.feedback_store import get_feedback_store
+    from db.milvus_client import MilvusParagraphClient
+
+    # Opening the store creates its tables and imports the legacy files
+    get_feedback_store()
+    client = MilvusParagraphClient()
+    if client.embedding_client is None:
+        print("Embedding service not available, only clustering what is already embedded")
+
+    clusterer = FeedbackClusterer(
+        feedback_db_path(),
+        embed=client.embed_texts if client.embedding_client is not None else None,
+        model=client.embedding_model,
+        max_k=args.max_k,
+    )
+    result = clusterer.update(batch_size=args.batch_size, full=args.full)
+    print(
+        f"Embedded {result['embedded']} ideas, "
+        f"{result['clusters']} clusters in {result['elements']} elements"
+    )
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""
+Feedback of the users on the paragraphs of the draft, in a local SQLite
+database (WAL mode). Each idea is one appended row, written by a background
+thread in batches, so saving never rewrites a user's whole history and
+concurrent saves from several tabs cannot overwrite each other.
+Counts per action are kept up to date on every write for the paragraph and
+each element of the law containing it (article, section, ..., book), so
+reading them never scans the feedback.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import streamlit as st
+
+from corpus.navigation import get_nav_tree
+
+
+# Actions a user can take on a paragraph (see pages/project.py)
+ACTIONS = ("additions", "deletions", "modifications", "questions")
+# Action under which the counts keep the total of every action
+TOTAL = "*"
+
+# (kind, id) of an element containing a paragraph, as in corpus.navigation,
+# plus ("paragraph", id) and ("all", "") for the whole draft
+Node = Tuple[str, str]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS feedback (
+    id INTEGER PRIMARY KEY,
+    user TEXT NOT NULL,
+    paragraph_id TEXT NOT NULL,
+    action TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS feedback_by_paragraph
+    ON feedback (paragraph_id, created_at);
+CREATE INDEX IF NOT EXISTS feedback_by_user
+    ON feedback (user, created_at);
+CREATE TABLE IF NOT EXISTS feedback_nodes (
+    kind TEXT NOT NULL,
+    node_id TEXT NOT NULL,
+    feedback_id INTEGER NOT NULL,
+    PRIMARY KEY (kind, node_id, feedback_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS feedback_counts (
+    kind TEXT NOT NULL,
+    node_id TEXT NOT NULL,
+    action TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (kind, node_id, action)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS feedback_counts_by_count
+    ON feedback_counts (kind, action, count DESC);
+CREATE TABLE IF NOT EXISTS legacy_imports (
+    filename TEXT PRIMARY KEY,
+    imported_at REAL NOT NULL
+);
+"""
+
+
+@dataclass
+class Feedback:
+    id: int
+    user: str
+    paragraph_id: str
+    action: str
+    text: str
+    created_at: float
+
+
+class FeedbackStore:
+    """Feedback of every user, shared by all the sessions of the process."""
+
+    def __init__(
+        self, path: str, locate: Optional[Callable[[str], Sequence[Node]]] = None
+    ):
+        """
+        Args:
+            path: SQLite database file
+            locate: Elements of the law containing a paragraph id, whose counts
+                are updated along with the paragraph's
+        """
+        self.path = path
+        self.locate = locate
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+
+        self._local = threading.local()
+        self._writes: "queue.Queue[tuple]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _reader(self) -> sqlite3.Connection:
+        # WAL lets every thread read while the writer thread commits
+        if not hasattr(self._local, "connection"):
+            self._local.connection = self._connect()
+        return self._local.connection
+
+    def add(self, user: str, paragraph_id: str, action: str, text: str):
+        """Queue an idea of a user about a paragraph."""
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown feedback action: {action}")
+        paragraph_id = str(paragraph_id)
+        self._writes.put(
+            (user, paragraph_id, action, text, time.time(), self._nodes(paragraph_id))
+        )
+
+    def _nodes(self, paragraph_id: str) -> List[Node]:
+        nodes = [("all", ""), ("paragraph", paragraph_id)]
+        if self.locate is not None:
+            nodes.extend((kind, str(id)) for kind, id in self.locate(paragraph_id))
+        return nodes
+
+    def flush(self):
+        """Wait until every queued write is committed."""
+        self._writes.join()
+
+    def _write_loop(self):
+        connection = self._connect()
+        while True:
+            write = self._writes.get()
+            try:
+                # Group every write queued meanwhile into a single transaction
+                batch = [write]
+                while True:
+                    try:
+                        batch.append(self._writes.get_nowait())
+                    except queue.Empty:
+                        break
+                try:
+                    with connection:
+                        self._insert(connection, batch)
+                except sqlite3.Error as e:
+                    print(f"Failed to save {len(batch)} feedback in one transaction: {e}")
+                    self._insert_each(connection, batch)
+            finally:
+                for _ in batch:
+                    self._writes.task_done()
+
+    @staticmethod
+    def _insert_each(connection: sqlite3.Connection, rows: List[tuple]):
+        # One transaction per row, so a failing row only loses itself
+        for row in rows:
+            try:
+                with connection:
+                    FeedbackStore._insert(connection, [row])
+            except sqlite3.Error as e:
+                user, paragraph_id, action, text, created_at, _ = row
+                print(
+                    f"Lost feedback of {user} on paragraph {paragraph_id} "
+                    f"({action}, {created_at}): {text!r}: {e}"
+                )
+
+    @staticmethod
+    def _insert(connection: sqlite3.Connection, rows: List[tuple]):
+        for user, paragraph_id, action, text, created_at, nodes in rows:
+            feedback_id = connection.execute(
+                """
+                INSERT INTO feedback (user, paragraph_id, action, text, created_at)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (user, paragraph_id, action, text, created_at),
+            ).lastrowid
+            FeedbackStore._count(connection, feedback_id, action, nodes)
+
+    @staticmethod
+    def _count(
+        connection: sqlite3.Connection, feedback_id: int, action: str, nodes: List[Node]
+    ):
+        connection.executemany(
+            "INSERT INTO feedback_nodes VALUES (?, ?, ?)",
+            [(kind, node_id, feedback_id) for kind, node_id in nodes],
+        )
+        connection.executemany(
+            """
+            INSERT INTO feedback_counts VALUES (?, ?, ?, 1)
+            ON CONFLICT (kind, node_id, action) DO UPDATE SET count = count + 1
+            """,
+            [(kind, node_id, a) for kind, node_id in nodes for a in (action, TOTAL)],
+        )
+
+    def rebuild_aggregates(self) -> int:
+        """
+        Recompute the counts of every element from the feedback, after the
+        structure of the draft changed. Waits for the queued writes first.
+
+        Returns:
+            Number of ideas counted
+        """
+        self.flush()
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                "SELECT id, paragraph_id, action FROM feedback"
+            ).fetchall()
+            nodes = {}
+            with connection:
+                connection.execute("DELETE FROM feedback_nodes")
+                connection.execute("DELETE FROM feedback_counts")
+                for feedback_id, paragraph_id, action in rows:
+                    if paragraph_id not in nodes:
+                        nodes[paragraph_id] = self._nodes(paragraph_id)
+                    self._count(connection, feedback_id, action, nodes[paragraph_id])
+        finally:
+            connection.close()
+        return len(rows)
+
+    def import_legacy(self, directory: str) -> int:
+        """
+        Import the per-user JSON files written before this store
+        ({directory}/{user}.json, paragraph id -> action -> texts).
+        Each file is imported once, dated with its modification time. Files
+        not in that shape are skipped.
+
+        Returns:
+            Number of ideas imported
+        """
+        if not os.path.isdir(directory):
+            return 0
+
+        imported = 0
+        connection = self._connect()
+        try:
+            done = {
+                filename
+                for (filename,) in connection.execute("SELECT filename FROM legacy_imports")
+            }
+            for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+                if not entry.name.endswith(".json") or entry.name in done:
+                    continue
+                user = entry.name[: -len(".json")]
+                try:
+                    with open(entry.path, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                    created_at = entry.stat().st_mtime
+                    rows = self._legacy_rows(user, data, created_at)
+                except (OSError, ValueError) as e:
+                    print(f"Failed to read legacy feedback {entry.name}: {e}")
+                    continue
+
+                with connection:
+                    self._insert(connection, rows)
+                    connection.execute(
+                        "INSERT INTO legacy_imports VALUES (?, ?)", (entry.name, time.time())
+                    )
+                imported += len(rows)
+        finally:
+            connection.close()
+        return imported
+
+    def _legacy_rows(self, user: str, data, created_at: float) -> List[tuple]:
+        # Raises ValueError if the file is not paragraph id -> action -> texts
+        if not isinstance(data, dict):
+            raise ValueError("expected an object of paragraphs")
+        rows = []
+        for paragraph_id, actions in data.items():
+            if not isinstance(actions, dict):
+                raise ValueError(f"expected an object of actions for paragraph {paragraph_id}")
+            nodes = self._nodes(str(paragraph_id))
+            for action, texts in actions.items():
+                if action not in ACTIONS:
+                    continue
+                if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                    raise ValueError(f"expected a list of texts for {action} of paragraph {paragraph_id}")
+                rows.extend(
+                    (user, str(paragraph_id), action, text, created_at, nodes) for text in texts
+                )
+        return rows
+
+    def _select(self, where: str, args: tuple, limit: Optional[int]) -> List[Feedback]:
+        rows = self._reader().execute(
+            f"""
+            SELECT id, user, paragraph_id, action, text, created_at FROM feedback
+            WHERE {where} ORDER BY created_at DESC, id DESC LIMIT ?
+            """,
+            (*args, limit if limit is not None else -1),
+        )
+        return [Feedback(*row) for row in rows]
+
+    def by_paragraph(
+        self, paragraph_id: str, action: Optional[str] = None, limit: Optional[int] = None
+    ) -> List[Feedback]:
+        """Newest feedback on a paragraph, optionally of a single action."""
+        if action is None:
+            return self._select("paragraph_id = ?", (str(paragraph_id),), limit)
+        return self._select(
+            "paragraph_id = ? AND action = ?", (str(paragraph_id), action), limit
+        )
+
+    def by_user(self, user: str, limit: Optional[int] = None) -> List[Feedback]:
+        """Newest feedback of a user."""
+        return self._select("user = ?", (user,), limit)
+
+    def size(self) -> int:
+        (size,) = self._reader().execute("SELECT COUNT(*) FROM feedback").fetchone()
+        return size
+
+    def counts(self, kind: str, node_id: str) -> Dict[str, int]:
+        """Feedback on an element by action, with the total under TOTAL."""
+        rows = self._reader().execute(
+            "SELECT action, count FROM feedback_counts WHERE kind = ? AND node_id = ?",
+            (kind, str(node_id)),
+        )
+        return dict(rows)
+
+    def counts_by_kind(self, kind: str) -> Dict[str, Dict[str, int]]:
+        """Counts of every element of a kind with feedback ('art', 'chapter', 'paragraph', ...)."""
+        counts: Dict[str, Dict[str, int]] = {}
+        rows = self._reader().execute(
+            "SELECT node_id, action, count FROM feedback_counts WHERE kind = ?", (kind,)
+        )
+        for node_id, action, count in rows:
+            counts.setdefault(node_id, {})[action] = count
+        return counts
+
+    def most_discussed(
+        self, kind: str, action: str = TOTAL, limit: int = 20
+    ) -> List[Tuple[str, int]]:
+        """(id, count) of the elements of a kind with the most feedback of an action."""
+        rows = self._reader().execute(
+            """
+            SELECT node_id, count FROM feedback_counts
+            WHERE kind = ? AND action = ? ORDER BY count DESC LIMIT ?
+            """,
+            (kind, action, limit),
+        )
+        return rows.fetchall()
+
+    def recent(self, kind: str, node_id: str, limit: int = 10) -> List[Feedback]:
+        """Newest feedback on an element or any of its paragraphs."""
+        rows = self._reader().execute(
+            """
+            SELECT f.id, f.user, f.paragraph_id, f.action, f.text, f.created_at
+            FROM feedback_nodes n JOIN feedback f ON f.id = n.feedback_id
+            WHERE n.kind = ? AND n.node_id = ?
+            ORDER BY n.feedback_id DESC LIMIT ?
+            """,
+            (kind, str(node_id), limit),
+        )
+        return [Feedback(*row) for row in rows]
+
+
+def locate_paragraph(paragraph_id: str) -> List[Node]:
+    """Elements of the current draft containing a paragraph."""
+    return get_nav_tree().locate(paragraph_id)
+
+
+@st.cache_resource
+def get_feedback_store() -> FeedbackStore:
+    """
+    Store shared by every session, saved at `dbs.feedback` of the secrets.
+    The JSON files of the previous version, in `feedback.legacy_dir`, are
+    imported the first time.
+    """
+    store = FeedbackStore(
+        st.secrets["dbs"].get("feedback", "./data/feedback.db"), locate=locate_paragraph
+    )
+    legacy_dir = st.secrets.get("feedback", {}).get("legacy_dir", "./data")
+    imported = store.import_legacy(legacy_dir)
+    if imported:
+        print(f"Imported {imported} ideas from {legacy_dir}")
+    # Databases written before the counts were kept
+    if store.counts("all", "").get(TOTAL, 0) != store.size():
+        store.rebuild_aggregates()
+    return store
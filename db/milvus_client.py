@@ -3,6 +3,7 @@ Milvus client for managing the anteproy_paragraphs collection.
 Handles CRUD operations for paragraphs with their metadata.
 """
 
+import hashlib
 import json
 import os
 import streamlit as st 
@@ -13,6 +14,16 @@ from pymilvus import (
 )
 from openai import OpenAI
 
+from chatbot.scheduler import Priority, get_scheduler
+from corpus.bundle import LAW_TABLES, Bundle, open_bundle
+from corpus.store import corpus_dirs
+from db.embedding_batcher import get_embedding_batcher
+from chatbot.singleflight import SingleFlight, request_key
+
+
+# Shared by every client of the process
+EMBEDDING_FLIGHTS = SingleFlight()
+
 
 class MilvusParagraphClient:
     """Client for managing paragraphs in Milvus vector database."""
@@ -34,7 +45,9 @@ class MilvusParagraphClient:
         self.data_path = data_path
         self.collection = None
         self.embedding_client = None
+        self.embedding_batcher = None
         self.embedding_model = embedding_model
+        self.embedding_base_url = embedding_base_url
         
         # Connect to Milvus Lite
         self._connect()
@@ -67,6 +80,12 @@ class MilvusParagraphClient:
                 input=["test"]
             )
             print("Embedding client initialized and tested successfully")
+            settings = st.secrets["embedding"]
+            self.embedding_batcher = get_embedding_batcher(
+                base_url, self.embedding_model, self._embedding_request,
+                max_batch=int(settings.get("batch_size", 32)),
+                max_wait=float(settings.get("batch_wait_ms", 8)) / 1000,
+            )
         except Exception as e:
             print(f"Failed to initialize embedding client: {e}")
             print("Warning: Embedding service is not accessible. The system will use zero vectors as fallback.")
@@ -137,7 +156,12 @@ class MilvusParagraphClient:
             raise
     
     def _load_json_data(self, filename: str) -> Dict[str, Any]:
-        """Load JSON data from file."""
+        """Load JSON data from the corpus bundle when it is up to date, or from file."""
+        name = os.path.splitext(filename)[0]
+        bundle = self._get_corpus_bundle()
+        if bundle is not None and name in LAW_TABLES:
+            return bundle.law_json(name)
+
         file_path = os.path.join(self.data_path, filename)
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
@@ -146,6 +170,14 @@ class MilvusParagraphClient:
             print(f"Failed to load {filename}: {e}")
             return {}
     
+    def _get_corpus_bundle(self) -> Optional[Bundle]:
+        """The corpus bundle, if it was built from the files in data_path and is up to date."""
+        if not hasattr(self, "_corpus_bundle"):
+            self._corpus_bundle = None
+            if os.path.abspath(self.data_path) == os.path.abspath(corpus_dirs()[0]):
+                self._corpus_bundle = open_bundle()
+        return self._corpus_bundle
+    
     def _get_metadata_for_paragraph(self, paragraph_id: str, metadata: Dict[str, Any]) -> Dict[str, str]:
         """Get metadata for a specific paragraph ID."""
         result = {}
@@ -190,15 +222,27 @@ class MilvusParagraphClient:
             return [0.0] * 768  # Return zero vector as fallback
         
         try:
-            response = self.embedding_client.embeddings.create(
-                model=self.embedding_model,
-                input=[text]
+            # Identical concurrent queries share a single embedding, and the
+            # rest are grouped with other sessions' queries into batched requests
+            return EMBEDDING_FLIGHTS.do(
+                request_key("embedding", self.embedding_model, text),
+                lambda: self.embedding_batcher.embed(text)
             )
-            return response.data[0].embedding
         except Exception as e:
             print(f"Failed to generate embedding: {e}")
             return [0.0] * 768  # Return zero vector as fallback
     
+    def _embedding_request(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of texts in a single request to the embedding service."""
+        response = get_scheduler(self.embedding_base_url, pool="embedding").run(
+            Priority.LOOKUP, None,
+            lambda: self.embedding_client.embeddings.create(
+                model=self.embedding_model,
+                input=texts
+            )
+        )
+        return [data.embedding for data in sorted(response.data, key=lambda d: d.index)]
+    
     def _generate_batch_embeddings(self, texts: List[str], batch_size: int = 100) -> List[List[float]]:
         """Generate embeddings for multiple texts in batches."""
         embeddings = []
@@ -378,13 +422,35 @@ class MilvusParagraphClient:
             limit: Maximum number of results to return
             source_filter: Filter by source ('paragraphs' or 'preamble')
         
+        Returns:
+            List of similar paragraphs with metadata
+        """
+        # Generate embedding for query
+        query_embedding = self.embed_query(query)
+        return self.search_by_embedding(query_embedding, limit=limit, source_filter=source_filter)
+    
+    def embed_query(self, query: str) -> List[float]:
+        """Generate the embedding used to search for a query."""
+        return self._generate_embedding(query)
+
+    def embed_texts(self, texts: List[str], batch_size: int = 100) -> List[List[float]]:
+        """Generate the embeddings of many texts in batched requests (zero vectors on failure)."""
+        return self._generate_batch_embeddings(texts, batch_size=batch_size)
+
+    def search_by_embedding(self, query_embedding: List[float], limit: int = 10,
+                            source_filter: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Search for similar paragraphs using an already computed query embedding.
+        
+        Args:
+            query_embedding: Embedding of the search query
+            limit: Maximum number of results to return
+            source_filter: Filter by source ('paragraphs' or 'preamble')
+        
         Returns:
             List of similar paragraphs with metadata
         """
         try:
-            # Generate embedding for query
-            query_embedding = self._generate_embedding(query)
-            
             # Prepare search parameters
             search_params = {
                 "metric_type": "COSINE",
@@ -482,6 +548,18 @@ class MilvusParagraphClient:
             print(f"Failed to get paragraph by ID: {e}")
             return None
     
+    def get_corpus_version(self) -> str:
+        """Get a version string that changes whenever the source JSON files change."""
+        signature = []
+        try:
+            for filename in sorted(os.listdir(self.data_path)):
+                if filename.endswith('.json'):
+                    stat = os.stat(os.path.join(self.data_path, filename))
+                    signature.append(f"{filename}:{stat.st_size}:{stat.st_mtime_ns}")
+        except OSError as e:
+            print(f"Failed to compute corpus version: {e}")
+        return hashlib.sha1("|".join(signature).encode()).hexdigest()
+    
     def get_collection_stats(self) -> Dict[str, Any]:
         """Get collection statistics."""
         try:
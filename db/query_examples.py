@@ -4,7 +4,7 @@ Example queries for the Milvus paragraph database.
 Demonstrates various search and retrieval operations.
 """
 
-from milvus_client import MilvusParagraphClient
+from db.milvus_client import MilvusParagraphClient
 
 
 def example_searches():
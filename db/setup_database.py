@@ -1,14 +1,18 @@
 #!/usr/bin/env python3
 """
 Setup script for the Milvus database.
-This script initializes the database and populates it with paragraph data.
+This script initializes the database and populates it with paragraph data
+and the precomputed questions and answers.
+
+Run from the repository root: python -m db.setup_database
 """
 
 import os
 import streamlit as st
 from pprint import pprint
 import sys
-from milvus_client import MilvusParagraphClient
+from db.milvus_client import MilvusParagraphClient
+from db.faq_client import MilvusFAQClient
 
 
 def main():
@@ -73,6 +77,13 @@ def main():
                 print(f"     Content: {result['content'][:80]}...")
                 pprint(result)
         
+        # Index the precomputed questions and answers
+        print("\nInserting frequent questions into database...")
+        faq_client = MilvusFAQClient()
+        faq_client.insert_questions()
+        faq_stats = faq_client.get_collection_stats()
+        print(f"Total questions: {faq_stats.get('total_entities', 0)}")
+        
         client.close()
         print("\nSetup completed successfully!")
         
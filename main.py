@@ -1,32 +1,23 @@
-import os
-import json
 import streamlit as st
-from ldap3 import Server, Connection, ALL, SUBTREE
+from ldap3 import Server, Connection, NONE, NO_ATTRIBUTES, RESTARTABLE, SUBTREE
+from ldap3.utils.conv import escape_filter_chars
 from dotenv import load_dotenv
+from contextlib import contextmanager
 from enum import Enum
 import hashlib
+import queue
+import threading
+import time
 from pydantic import BaseModel
 
+from corpus.store import get_corpus
+
 load_dotenv()
 
 st.session_state.bopened = None
 st.session_state.btype = None
 
 
-def load_json_files_from_directory(directory_path):
-    json_dict = {}
-    # Listar todos los ficheros en el directorio
-    for filename in os.listdir(directory_path):
-        # Comprobar que es un fichero JSON
-        if filename.endswith(".json"):
-            full_path = os.path.join(directory_path, filename)
-            with open(full_path, "r", encoding="utf-8") as f:
-                content = json.load(f)
-                name_without_extension = os.path.splitext(filename)[0]
-                json_dict[name_without_extension] = content
-    return json_dict
-
-
 class Query(str, Enum):
     APPROVED = "APPROBADO"
     ERROR_NOT_FOUND = "ERROR_NO_ENCONTRADO"
@@ -48,40 +39,143 @@ def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
 
-def check_user(user: User):
-    try:
-        server = Server(st.secrets["ldap"]["address"], get_info=ALL)
-        conn = Connection(
-            server,
-            f"cn={st.secrets["ldap"]["user"]},dc=uh,dc=cu",
-            st.secrets["ldap"]["passwd"],
+class LdapDirectory:
+    """
+    Directorio LDAP compartido por todas las sesiones: reutiliza las conexiones
+    de la cuenta de servicio y recuerda por un rato el DN de cada usuario, de
+    modo que un login solo hace el bind del propio usuario.
+    """
+
+    def __init__(
+        self,
+        address,
+        service_user,
+        service_password,
+        base="dc=uh,dc=cu",
+        connect_timeout=5,
+        receive_timeout=10,
+        pool_size=4,
+        dn_cache_ttl=300,
+    ):
+        self.server = Server(address, get_info=NONE, connect_timeout=connect_timeout)
+        self.service_dn = f"cn={service_user},{base}"
+        self.service_password = service_password
+        self.base = base
+        self.receive_timeout = receive_timeout
+        self.dn_cache_ttl = dn_cache_ttl
+        # Conexiones de servicio libres, la más reciente primero
+        self._idle = queue.LifoQueue(maxsize=pool_size)
+        self._dns = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _service_connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = Connection(
+                self.server,
+                self.service_dn,
+                self.service_password,
+                auto_bind=True,
+                client_strategy=RESTARTABLE,
+                receive_timeout=self.receive_timeout,
+                read_only=True,
+            )
+        try:
+            yield conn
+        except Exception:
+            # Una conexión que falló no vuelve al pool
+            conn.unbind()
+            raise
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.unbind()
+
+    def find_dn(self, username):
+        """DN del usuario, o None si no existe. Los DN encontrados se guardan dn_cache_ttl segundos."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._dns.get(username)
+        if cached is not None and now - cached[0] < self.dn_cache_ttl:
+            return cached[1]
+
+        with self._service_connection() as conn:
+            # Solo se pide el DN, filtrando por uid (atributo indexado)
+            conn.search(
+                search_base=self.base,
+                search_filter=f"(uid={escape_filter_chars(username)})",
+                search_scope=SUBTREE,
+                attributes=NO_ATTRIBUTES,
+                size_limit=1,
+            )
+            dn = conn.entries[0].entry_dn if conn.entries else None
+
+        # Un usuario no encontrado puede crearse en cualquier momento, no se guarda
+        if dn is not None:
+            with self._lock:
+                self._dns[username] = (now, dn)
+        return dn
+
+    def forget(self, username):
+        with self._lock:
+            self._dns.pop(username, None)
+
+    def authenticate(self, dn, password):
+        """Bind con las credenciales del usuario; lanza una excepción si fallan."""
+        user_conn = Connection(
+            self.server,
+            dn,
+            password,
             auto_bind=True,
+            receive_timeout=self.receive_timeout,
         )
+        user_conn.unbind()
+
+
+@st.cache_resource
+def get_ldap_directory():
+    settings = st.secrets["ldap"]
+    return LdapDirectory(
+        settings["address"],
+        settings["user"],
+        settings["passwd"],
+        base=settings.get("base", "dc=uh,dc=cu"),
+        connect_timeout=float(settings.get("connect_timeout", 5)),
+        receive_timeout=float(settings.get("receive_timeout", 10)),
+        pool_size=int(settings.get("pool_size", 4)),
+        dn_cache_ttl=float(settings.get("dn_cache_ttl", 300)),
+    )
 
-        # 2. Buscar el DN del usuario
-        search_filter = f"(uid={user.username})"  # Puede ser 'sAMAccountName', 'cn', etc. según tu LDAP
-        conn.search(
-            search_base="dc=uh,dc=cu",
-            search_filter=search_filter,
-            search_scope=SUBTREE,
-            attributes=["*"],
-        )
 
-        if not conn.entries:
+def check_user(user: User):
+    # Un bind con contraseña vacía es anónimo y siempre tiene éxito
+    if not user.username or not user.pasw:
+        return Query.ERROR_PASSWORD
+
+    directory = None
+    try:
+        directory = get_ldap_directory()
+
+        # 1. Buscar el DN del usuario
+        user_dn = directory.find_dn(user.username)
+        if user_dn is None:
             return Query.ERROR_NOT_FOUND
 
-        user_dn = conn.entries[0].entry_dn
-        # 3. Intentar autenticar con las credenciales del usuario
-        user_conn = Connection(server, user_dn, user.pasw, auto_bind=True)
+        # 2. Intentar autenticar con las credenciales del usuario
+        directory.authenticate(user_dn, user.pasw)
 
         # Si llegamos aquí, la autenticación fue exitosa
-        user_conn.unbind()
         return Query.APPROVED
 
     except Exception as e:
         if "invalidCredentials" in str(e):
             return Query.ERROR_PASSWORD
         else:
+            # El DN guardado puede ser la causa (p. ej. el usuario se movió)
+            if directory is not None:
+                directory.forget(user.username)
             return Query.ERROR_SERVICE
 
 
@@ -116,40 +210,6 @@ def logout():
     st.rerun()
 
 
-def rebuild_articles_dict(all):
-    for art in all["articles"].values():
-        apb = int(art["begin"])
-        ape = int(art["end"])
-        art["book"] = None
-        for idb, book in all["books"].items():
-            if int(book["begin"]) <= apb and ape <= int(book["end"]):
-                art["book"] = int(idb) + 1
-                break
-        art["title"] = None
-        for idt, title in all["titles"].items():
-            if int(title["begin"]) <= apb and ape <= int(title["end"]):
-                art["title"] = idt
-                break
-        art["chapter"] = None
-        for idc, chapter in all["chapters"].items():
-            if int(chapter["begin"]) <= apb and ape <= int(chapter["end"]):
-                art["chapter"] = idc
-                break
-        art["section"] = None
-        for ids, section in all["sections"].items():
-            if int(section["begin"]) <= apb and ape <= int(section["end"]):
-                art["section"] = ids
-                break
-
-def rebuild_simple_mapping(items):
-    res = {}
-    for item in items["pairs"]:
-        current = item["Project_Law"]
-        rids = [i["id"] for i in item["Actual_Law"]]
-        res[current["id"]] = rids
-    return res
-    
-
 login_page = st.Page(login, title="Log in", icon=":material/login:")
 logout_page = st.Page(logout, title="Log out", icon=":material/logout:")
 intro_page = st.Page("pages/intro.py", title="Inicio", icon=":material/home:")
@@ -162,6 +222,14 @@ project_page = st.Page(
 )
 chat_page = st.Page("pages/chat.py", title="Asistente", icon=":material/chat_bubble:")
 search_page = st.Page("pages/search.py", title="Buscar", icon=":material/search:")
+feedback_page = st.Page(
+    "pages/feedback.py", title="Participación", icon=":material/insights:"
+)
+
+
+def is_admin(username):
+    admins = st.secrets["user"].get("admins", [st.secrets["user"]["default_user"]])
+    return username in admins
 
 
 # Initialize session state
@@ -172,26 +240,19 @@ if "logged_in" not in st.session_state:
 if not st.session_state.logged_in:
     pg = st.navigation([login_page])
 else:
-    with st.spinner("Wait for it...", show_time=True):
-        project = load_json_files_from_directory(st.secrets["dirs"]["project"]["law"])
-        rebuild_articles_dict(project)
-        intro = load_json_files_from_directory(st.secrets["dirs"]["project"]["intro"])
-        mappings = load_json_files_from_directory(st.secrets["dirs"]["mappings"])
-        st.session_state["project"] = project
-        st.session_state["intro"] = intro
-        st.session_state["mappings"] = mappings
-        st.session_state["mappings"]["policies"] = rebuild_simple_mapping(mappings["politicas_vs_articulo"])
-        st.session_state["mappings"]["diagnosis"] = rebuild_simple_mapping(mappings["diagnostico_vs_articulo"])
-    pg = st.navigation(
-        [
-            intro_page,
-            ideas_page,
-            project_page,
-            chat_page,
-            question_page,
-            search_page,
-            logout_page,
-        ]
-    )
+    # Shared by every session and rebuilt only when its files change;
+    # pages read it with get_corpus() instead of keeping their own copy
+    get_corpus()
+    pages = [
+        intro_page,
+        ideas_page,
+        project_page,
+        chat_page,
+        question_page,
+        search_page,
+    ]
+    if is_admin(st.session_state.username):
+        pages.append(feedback_page)
+    pg = st.navigation(pages + [logout_page])
 
 pg.run()
@@ -1,16 +1,92 @@
 import os
-from chatbot.history import Message, TalkHistory
+from typing import Optional
+from chatbot.history import TalkHistory
 from chatbot.models import intents
+from chatbot.answer_cache import get_answer_cache
 from chatbot.client import WrappedClient, load_client
+from chatbot.retrieval import new_conversation_retrieval
+from chatbot.scheduler import QueueFull
+from chatbot.sessions import MessagePage, get_page_size, get_session_store
+from chatbot.streaming import coalesce_stream
+from chatbot.traces import load_trace_store
 import streamlit as st
 
+from db.faq_client import MilvusFAQClient
 from db.milvus_client import MilvusParagraphClient
 
-db = MilvusParagraphClient()
+@st.cache_resource
+def get_milvus_client():
+    return MilvusParagraphClient()
 
 
-def save_history(conversation: TalkHistory):
-    st.session_state["ai-messages"] = conversation.model_dump()
+@st.cache_resource
+def get_faq_client():
+    return MilvusFAQClient()
+
+
+db = get_milvus_client()
+faq = get_faq_client()
+sessions = get_session_store()
+page_size = get_page_size()
+
+
+def open_conversation(conversation_id: Optional[str] = None):
+    """Load the most recent page of a saved conversation, or start a new one."""
+    if conversation_id is None:
+        conversation_id = sessions.new_conversation_id()
+        page = MessagePage(messages=[], first_seq=0)
+    else:
+        page = sessions.load_page(conversation_id, page_size)
+
+    st.session_state["ai-conversation"] = conversation_id
+    st.session_state["ai-messages"] = TalkHistory(page.messages)
+    # Context found by the previous turns, reused by follow-up questions
+    st.session_state["ai-retrieval"] = new_conversation_retrieval(db)
+    st.session_state["ai-first-seq"] = page.first_seq
+    # Only the last messages are drawn, so a rerun costs the same for long conversations
+    st.session_state["ai-shown"] = page_size
+
+
+def load_earlier():
+    conversation: TalkHistory = st.session_state["ai-messages"]
+
+    if st.session_state["ai-shown"] >= len(conversation):
+        page = sessions.load_page(
+            st.session_state["ai-conversation"],
+            page_size,
+            before_seq=st.session_state["ai-first-seq"],
+        )
+        st.session_state["ai-messages"] = TalkHistory([*page.messages, *conversation])
+        st.session_state["ai-first-seq"] = page.first_seq
+
+    st.session_state["ai-shown"] += page_size
+
+
+def save_history(conversation: TalkHistory, query: str, answer: str):
+    # Stored as is: the history is immutable and shares its messages between turns
+    st.session_state["ai-messages"] = conversation.append("user", query).append(
+        "assistant", answer
+    )
+    sessions.append_messages(
+        st.session_state.username,
+        st.session_state["ai-conversation"],
+        [("user", query), ("assistant", answer)],
+    )
+
+
+def format_faq_answer(match: dict) -> str:
+    answer = match["answer"]
+    if match["citation"]:
+        answer += f"\n\n*Fuente: {match['citation']} del Anteproyecto.*"
+    return answer
+
+
+def stream_answer(response) -> str:
+    """Write a streamed answer in grouped updates, without the model's reasoning."""
+    stream = coalesce_stream(response)
+    answer = st.write_stream(stream)
+    st.session_state["ai-last-stream"] = stream.stats.as_dict()
+    return answer
 
 
 def speak(
@@ -21,6 +97,25 @@ def speak(
 ):
     intent = None
     answer = None
+    retrieval = st.session_state["ai-retrieval"]
+
+    # Frequent questions are answered from the precomputed Q&A without the LLM
+    query_embedding = db.embed_query(query)
+    faq_match = faq.find_answer(query_embedding)
+
+    if faq_match:
+        if debug_view:
+            st.write(
+                f"FAQ match ({faq_match['similarity_score']:.3f}): {faq_match['question']}"
+            )
+
+        answer = format_faq_answer(faq_match)
+
+        with st.chat_message(assistant_name):
+            st.write(answer)
+
+        save_history(conversation, query, answer)
+        return
 
     with st.spinner("Communicating with AI"):
         intent = ai_client.query_classify_intent(TalkHistory.empty(), query)
@@ -35,15 +130,35 @@ def speak(
             st.write(answer)
     elif intent.classification == intents.IntentType.LAW:
         with st.spinner("Communicating with AI"):
-            answer = ai_client.query_talk_with_knowledge(conversation, query, db)
+            answer = ai_client.query_talk_with_knowledge(
+                conversation,
+                query,
+                db,
+                cache=get_answer_cache(),
+                query_embedding=query_embedding,
+                hits=retrieval.retrieve(query_embedding),
+            )
 
         with st.chat_message(assistant_name):
-            answer = st.write_stream(answer)
+            answer = stream_answer(answer)
 
-        conversation.msg_history.append(Message(role="user", content=query))
-        conversation.msg_history.append(Message(role="assistant", content=answer))
+        save_history(conversation, query, answer)
+    elif retrieval.has_context:
+        # A neutral follow-up ("explícalo mejor") keeps the context of the
+        # previous turns. Its answer depends on them, so it is not cached.
+        with st.spinner("Communicating with AI"):
+            answer = ai_client.query_talk_with_knowledge(
+                conversation,
+                query,
+                db,
+                query_embedding=query_embedding,
+                hits=retrieval.reuse(),
+            )
 
-        save_history(conversation)
+        with st.chat_message(assistant_name):
+            answer = stream_answer(answer)
+
+        save_history(conversation, query, answer)
     else:
         with st.spinner("Communicating with AI"):
             answer = ai_client.query_simple(
@@ -52,55 +167,27 @@ def speak(
             )
 
         with st.chat_message(assistant_name):
-            answer = st.write_stream(answer)
-
-        conversation.msg_history.append(Message(role="user", content=query))
-        conversation.msg_history.append(Message(role="assistant", content=answer))
-
-        save_history(conversation)
-
-
-if ("logged_in" in st.session_state) and st.session_state.logged_in:
-    st.title("Asistente del Anteproyecto del Código de Trabajo")
+            answer = stream_answer(answer)
 
-    # Every seen test has its own message history saved
-    if "ai-messages" not in st.session_state:
-        st.session_state["ai-messages"] = TalkHistory(msg_history=[]).model_dump()
+        save_history(conversation, query, answer)
 
-    conversation: TalkHistory = TalkHistory(**st.session_state["ai-messages"])
 
-    ai_client = load_client()
-
-    # WATCH: this is a possible change for later
-    # The name that will be showed in the LLM messages
-    assistant_name = "ai"
-
-    debug_view = False
-
-    # WATCH: this should change when getting up production environment
-    if os.getenv("ENV") == "dev":
-        debug_view = st.checkbox("Debug View")
-
-    if debug_view:
-        st.session_state
-
-    left = None
-    right = None
-    message_box = None
-
-    # Shows debug on the right side with the requests made to the LLM
-    if debug_view:
-        left, right = st.columns([0.6, 0.4])
-
-    if debug_view:
-        with left:
-            message_box = st.container(border=True)
-    else:
-        message_box = st.container(border=True)
+@st.fragment
+def chat_fragment(ai_client: WrappedClient, assistant_name: str):
+    """
+    Transcript and input box. Sending a message reruns only this fragment:
+    the input has to live in the same fragment as the transcript it updates.
+    """
+    conversation: TalkHistory = st.session_state["ai-messages"]
+    message_box = st.container(border=True)
 
     user_input = st.chat_input("Di algo")
     with message_box:
-        for message in conversation.msg_history:
+        shown = st.session_state["ai-shown"]
+        if shown < len(conversation) or st.session_state["ai-first-seq"] > 0:
+            st.button("Cargar mensajes anteriores", on_click=load_earlier)
+
+        for message in conversation.last(shown):
             # WATCH: Change for the username
             with st.chat_message("human" if message.role == "user" else assistant_name):
                 st.write(message.content)
@@ -119,26 +206,114 @@ if ("logged_in" in st.session_state) and st.session_state.logged_in:
             with st.chat_message("human"):
                 st.markdown(user_input)
 
-        with message_box:
-            speak(
-                ai_client,
-                conversation,
-                assistant_name,
-                user_input,
+            # Shown only while the request waits for a free slot of the LLM server
+            queue_notice = st.empty()
+            ai_client.on_wait = lambda position: queue_notice.info(
+                f"El asistente está atendiendo otras consultas. Su posición en la cola: {position}"
             )
 
+            try:
+                speak(
+                    ai_client,
+                    conversation,
+                    assistant_name,
+                    user_input,
+                )
+            except QueueFull:
+                st.warning(
+                    "El asistente está saturado en este momento. Por favor, intente de nuevo en unos minutos."
+                )
+            finally:
+                queue_notice.empty()
+
+
+@st.fragment
+def debug_fragment(ai_client: WrappedClient):
+    """Caches, scheduler and requests made to the LLM, refreshed on demand."""
+    st.button("Actualizar")
+
+    st.write("Conversation:")
+    st.json(
+        {
+            "id": st.session_state["ai-conversation"],
+            "loaded_messages": len(st.session_state["ai-messages"]),
+            "shown_messages": st.session_state["ai-shown"],
+        },
+        expanded=False,
+    )
+    st.write("Conversation retrieval:")
+    st.json(st.session_state["ai-retrieval"].stats(), expanded=False)
+    st.write("Answer cache:")
+    st.json(get_answer_cache().stats(), expanded=False)
+    st.write("LLM response cache:")
+    st.json(ai_client.responses.stats(), expanded=False)
+    st.write("Last streamed answer:")
+    st.json(st.session_state.get("ai-last-stream", {}), expanded=False)
+    st.write("LLM scheduler:")
+    st.json(ai_client.scheduler.stats(), expanded=False)
+
+    for request in ai_client.traces:
+        with st.expander(f"{request.message}"):
+            st.write("Context:")
+            st.json(request.context, expanded=False)
+            st.write(f"failed: {request.failed}")
+            st.write(f"latency: {request.latency}")
+            st.write(f"response: {request.response}")
+
+
+if ("logged_in" in st.session_state) and st.session_state.logged_in:
+    st.title("Asistente del Anteproyecto del Código de Trabajo")
+
+    # Conversations are saved per user and can be resumed from the sidebar
+    if "ai-conversation" not in st.session_state:
+        open_conversation()
+
+    with st.sidebar:
+        if st.button("Nueva conversación"):
+            open_conversation()
+
+        saved = {
+            c.id: c.title
+            for c in sessions.list_conversations(st.session_state.username)
+        }
+        current = st.session_state["ai-conversation"]
+        if current not in saved:
+            saved = {current: "Conversación actual", **saved}
+
+        selected = st.selectbox(
+            "Conversaciones",
+            list(saved),
+            index=list(saved).index(current),
+            format_func=saved.get,
+        )
+        if selected != current:
+            open_conversation(selected)
+
+    # Every session keeps its own bounded trace of the requests made to the LLM
+    # and its own client, built once instead of on every rerun
+    if "ai-client" not in st.session_state:
+        st.session_state["ai-traces"] = load_trace_store(st.session_state.username)
+        st.session_state["ai-client"] = load_client(st.session_state["ai-traces"])
+
+    ai_client: WrappedClient = st.session_state["ai-client"]
+
+    # WATCH: this is a possible change for later
+    # The name that will be showed in the LLM messages
+    assistant_name = "ai"
+
+    debug_view = False
+
+    # WATCH: this should change when getting up production environment
+    if os.getenv("ENV") == "dev":
+        debug_view = st.checkbox("Debug View")
+
+    # Shows debug on the right side with the requests made to the LLM
     if debug_view:
+        left, right = st.columns([0.6, 0.4])
+
+        with left:
+            chat_fragment(ai_client, assistant_name)
         with right:
-            with st.container():
-                for request in ai_client.requests_history:
-                    with st.expander(f"{request.message}"):
-                        st.write("Context:")
-                        st.json(
-                            [
-                                message.model_dump()
-                                for message in request.context.msg_history
-                            ],
-                            expanded=False,
-                        )
-                        st.write(f"failed: {request.failed}")
-                        st.write(f"response: {request.response}")
+            debug_fragment(ai_client)
+    else:
+        chat_fragment(ai_client, assistant_name)
@@ -0,0 +1,130 @@
+import datetime
+
+import streamlit as st
+
+from corpus.navigation import get_nav_tree
+from db.feedback_clusters import get_feedback_clusters
+from db.feedback_store import ACTIONS, TOTAL, get_feedback_store
+
+store = get_feedback_store()
+clusters = get_feedback_clusters()
+nav = get_nav_tree()
+
+ACTION_NAMES = {
+    "additions": "Adicionar",
+    "deletions": "Eliminar",
+    "questions": "Duda",
+    "modifications": "Cambiar",
+}
+LEVELS = {
+    "art": "Artículos",
+    "pro": "Disposiciones",
+    "section": "Secciones",
+    "chapter": "Capítulos",
+    "title": "Títulos",
+    "book": "Libros",
+}
+
+
+def node_name(kind, id):
+    if kind == "art":
+        return f"Artículo {id}. {nav.label((kind, id))}"
+    return nav.labels.get((kind, id), id)
+
+
+def render_totals():
+    totals = store.counts("all", "")
+    cols = st.columns(len(ACTIONS) + 1)
+    cols[0].metric("Total", totals.get(TOTAL, 0))
+    for col, action in zip(cols[1:], ACTIONS):
+        col.metric(ACTION_NAMES[action], totals.get(action, 0))
+
+
+def render_ranking(kind, action, limit):
+    ranking = store.most_discussed(kind, action, limit)
+    if len(ranking) == 0:
+        st.info("Todavía no hay opiniones.")
+        return None
+
+    counts = store.counts_by_kind(kind)
+    rows = [
+        {
+            "id": id,
+            "Elemento": node_name(kind, id),
+            **{ACTION_NAMES[a]: counts[id].get(a, 0) for a in ACTIONS},
+            "Total": counts[id].get(TOTAL, 0),
+        }
+        for id, _ in ranking
+    ]
+    top = max(row["Total"] for row in rows)
+    event = st.dataframe(
+        rows,
+        hide_index=True,
+        column_order=["Elemento", *ACTION_NAMES.values(), "Total"],
+        column_config={
+            "Total": st.column_config.ProgressColumn(
+                "Total", format="%d", min_value=0, max_value=top
+            )
+        },
+        on_select="rerun",
+        selection_mode="single-row",
+    )
+    selected = event.selection.rows
+    return rows[selected[0]]["id"] if selected else None
+
+
+def render_clusters(kind, id):
+    node_clusters = clusters.clusters(kind, id)
+    if len(node_clusters) == 0:
+        return
+    with st.expander(f"Grupos de opiniones similares ({len(node_clusters)})"):
+        for cluster in node_clusters:
+            actions = ", ".join(
+                f"{ACTION_NAMES[a]}: {n}" for a, n in cluster.actions.items()
+            )
+            st.markdown(f"**{cluster.size} opiniones** · {actions}")
+            for _, text in cluster.representatives:
+                st.markdown(f"> {text}")
+
+
+def render_recent(kind, id):
+    st.subheader(node_name(kind, id))
+    render_clusters(kind, id)
+    for feedback in store.recent(kind, id, limit=20):
+        date = datetime.datetime.fromtimestamp(feedback.created_at)
+        with st.container(border=True):
+            st.caption(
+                f"{ACTION_NAMES[feedback.action]} · párrafo {feedback.paragraph_id} · "
+                f"{feedback.user} · {date:%Y-%m-%d %H:%M}"
+            )
+            st.markdown(feedback.text)
+
+
+st.title("Participación")
+
+render_totals()
+
+cols = st.columns(3)
+with cols[0]:
+    kind = st.selectbox("Nivel", options=list(LEVELS), format_func=lambda x: LEVELS[x])
+with cols[1]:
+    action = st.selectbox(
+        "Acción",
+        options=[TOTAL, *ACTIONS],
+        format_func=lambda x: "Todas" if x == TOTAL else ACTION_NAMES[x],
+    )
+with cols[2]:
+    limit = st.number_input("Mostrar", min_value=5, max_value=500, value=20, step=5)
+
+selected = render_ranking(kind, action, int(limit))
+if selected is not None:
+    render_recent(kind, selected)
+
+with st.expander("Mantenimiento"):
+    st.caption(
+        "Los conteos se actualizan con cada opinión. Si la estructura del "
+        "anteproyecto cambia, recalcúlelos para asignar las opiniones a los nuevos elementos."
+    )
+    if st.button("Recalcular conteos"):
+        counted = store.rebuild_aggregates()
+        st.success(f"{counted} opiniones recontadas.")
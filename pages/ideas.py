@@ -1,13 +1,17 @@
 import streamlit as st
 
-polmap = st.session_state["mappings"]["policies"]
-diamap = st.session_state["mappings"]["diagnosis"]
+from corpus.store import get_corpus
+
+corpus = get_corpus()
+intro = corpus.intro
+polmap = corpus.mappings["policies"]
+diamap = corpus.mappings["diagnosis"]
 
 # st.write(polmap)
 # st.write(diamap)
 
 def render_diagnosis(did):
-    diag = st.session_state.intro["diagnosis"][did]
+    diag = intro["diagnosis"][did]
     st.markdown(diag)
     if did in diamap and did!="1":
         with st.expander("Algunos artículos relacionados en el proyecto"):
@@ -19,7 +23,7 @@ def render_diagnosis(did):
                         st.switch_page("pages/project.py")
     
 def render_policy(pid):
-    pol = st.session_state.intro["policies"][pid]
+    pol = intro["policies"][pid]
     st.markdown(pol)
     if pid in polmap:
         with st.expander("Algunos artículos relacionados en el proyecto"):
@@ -32,17 +36,17 @@ def render_policy(pid):
     
 
 with st.expander("Introducción"):
-    for p in st.session_state.intro["intro"].values():
+    for p in intro["intro"].values():
         st.markdown(p)
         
 with st.expander("Antecentes"):
-    for p in st.session_state.intro["background"].values():
+    for p in intro["background"].values():
         st.markdown(p)
         
 with st.expander("Diagnóstico"):
-    for did in st.session_state.intro["diagnosis"].keys():
+    for did in intro["diagnosis"].keys():
         render_diagnosis(did)
         
 with st.expander("Políticas"):
-    for did in st.session_state.intro["policies"].keys():
+    for did in intro["policies"].keys():
         render_policy(did)
\ No newline at end of file
@@ -0,0 +1,89 @@
+import streamlit as st
+
+from corpus.faq_index import get_faq_index
+from corpus.navigation import get_nav_tree
+from corpus.store import get_corpus
+
+qa = get_corpus().qa
+index = get_faq_index()
+nav = get_nav_tree()
+page_size = int(st.secrets.get("faq", {}).get("page_size", 20))
+
+# Element each level of questions was generated from, to show it with the answer
+SOURCE_KINDS = {
+    "books": "book",
+    "titles": "title",
+    "chapters": "chapter",
+    "sections": "section",
+    "articles": "art",
+}
+
+
+def source_name(pair):
+    node = (SOURCE_KINDS[pair["level"]], pair["source_id"])
+    if node[0] == "art":
+        return f"Artículo {node[1]}. {nav.label(node)}"
+    return nav.labels.get(node, "")
+
+
+def filter_select(label, options, all_label):
+    options = [None] + options
+    return st.selectbox(
+        label,
+        options=options,
+        format_func=lambda x: all_label if x is None else nav.label(x),
+    )
+
+
+def show_more():
+    st.session_state["faq-shown"] += page_size
+
+
+@st.fragment
+def render_results(results):
+    # Only the questions shown so far are rendered, "Mostrar más" adds a page
+    shown = st.session_state["faq-shown"]
+    st.caption(f"{len(results)} preguntas")
+
+    for i in results[:shown]:
+        pair = qa[i]
+        with st.expander(pair["question"]):
+            st.markdown(pair["answer"])
+            st.caption(source_name(pair))
+
+    if shown < len(results):
+        st.button("Mostrar más", on_click=show_more)
+
+
+st.title("Preguntas frecuentes")
+
+query = st.text_input(
+    "Buscar", placeholder="p. ej. vacaciones, salario mínimo, período de prueba..."
+)
+
+cols = st.columns(3)
+with cols[0]:
+    books = [node for node in nav.top_level() if node[0] == "book"]
+    book = filter_select("Libro", books, "Todos")
+title = chapter = None
+if book is not None:
+    with cols[1]:
+        title = filter_select("Título", nav.children(book, "title"), "Todos")
+if title is not None and nav.children(title, "chapter"):
+    with cols[2]:
+        chapter = filter_select("Capítulo", nav.children(title, "chapter"), "Todos")
+
+results = index.search(
+    query,
+    book=book[1] if book else None,
+    title=title[1] if title else None,
+    chapter=chapter[1] if chapter else None,
+)
+
+# A new search starts again from the first page
+search_key = (query, book, title, chapter)
+if st.session_state.get("faq-search") != search_key:
+    st.session_state["faq-search"] = search_key
+    st.session_state["faq-shown"] = page_size
+
+render_results(results)
@@ -1,6 +1,6 @@
+from corpus.store import get_corpus, get_text_store
 from db.milvus_client import MilvusParagraphClient
 import streamlit as st
-import json
 
 @st.cache_resource
 def get_milvus_client():
@@ -11,55 +11,32 @@ client = get_milvus_client()
 def search(query: str, limit: int = 10):
     return client.search_similar_paragraphs(query, limit=limit)
 
-@st.cache_data
 def load_articles_data():
-    """Load articles.json data"""
-    articles_path = "./jsons/anteproyecto/law/articles.json"
-    try:
-        with open(articles_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        st.error(f"Error loading articles data: {e}")
-        return {}
-
-@st.cache_data
-def load_paragraphs_data():
-    """Load paragraphs.json data"""
-    paragraphs_path = "./jsons/anteproyecto/law/paragraphs.json"
-    try:
-        with open(paragraphs_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        st.error(f"Error loading paragraphs data: {e}")
-        return {}
+    """Articles of the shared corpus, with their own titles"""
+    project = get_corpus().project
+    return {
+        aid: {**article, "title": project["article_titles"][aid]}
+        for aid, article in project["articles"].items()
+    }
 
-def get_article_content(article_id: str, articles_data: dict, paragraphs_data: dict):
-    """Get full article content from paragraphs data"""
+def get_article_content(article_id: str, articles_data: dict):
+    """Get full article content from the text of the shared corpus"""
     if article_id not in articles_data:
         return None
     
-    article_info = articles_data[article_id]
-    begin_line = article_info.get('begin')
-    end_line = article_info.get('end')
-    
-    if begin_line is None or end_line is None:
+    text_store = get_text_store()
+    if not text_store.has_block("articles", article_id):
         return None
     
-    # Extract content from paragraphs
-    content_lines = []
-    for line_num in range(begin_line, end_line + 1):
-        line_key = str(line_num)
-        if line_key in paragraphs_data:
-            content_lines.append(paragraphs_data[line_key])
-    
+    article_info = articles_data[article_id]
     return {
         'title': article_info.get('title', ''),
-        'content': '\n'.join(content_lines),
-        'begin': begin_line,
-        'end': end_line
+        'content': text_store.block_text("articles", article_id),
+        'begin': article_info.get('begin'),
+        'end': article_info.get('end')
     }
 
-def display_search_result(result, articles_data, paragraphs_data):
+def display_search_result(result, articles_data):
     """Display a single search result as a clickable container"""
     metadata = result.get('metadata', {})
     article_title = metadata.get('article_title', '')
@@ -88,7 +65,7 @@ def display_search_result(result, articles_data, paragraphs_data):
         # Add click handler
         if article_id and article_id in articles_data:
             if st.button(f"View Full Article {article_id}", key=f"view_{result['id']}"):
-                article_content = get_article_content(article_id, articles_data, paragraphs_data)
+                article_content = get_article_content(article_id, articles_data)
                 if article_content:
                     st.session_state[f"show_article_{result['id']}"] = article_content
                 else:
@@ -122,7 +99,6 @@ if ("logged_in" in st.session_state) and st.session_state.logged_in:
 
     # Load data
     articles_data = load_articles_data()
-    paragraphs_data = load_paragraphs_data()
 
     # Search interface
     query = st.text_input("Search for articles, provisions, or legal concepts", placeholder="e.g., trabajo, salario, vacaciones...")
@@ -154,7 +130,7 @@ if ("logged_in" in st.session_state) and st.session_state.logged_in:
                     
                     # Display paginated results
                     for i, result in enumerate(paginated_results):
-                        display_search_result(result, articles_data, paragraphs_data)
+                        display_search_result(result, articles_data)
                         
                         # Check if this article should be shown
                         if f"show_article_{result['id']}" in st.session_state:
@@ -1,8 +1,17 @@
 # utils.py
 import json
 import os
+import sys
 from typing import Dict, List
 
+from tqdm import tqdm
+
+# Los scripts se ejecutan desde esta carpeta: la raíz del repositorio se
+# añade a la ruta para usar el paquete corpus
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus.text import CorpusTextStore
+
 def load_json(file_path: str) -> Dict | List:
     """Carga un archivo JSON desde la ruta especificada."""
     try:
@@ -27,6 +36,8 @@ def reconstruct_complex_text(metadata_path: str, paragraphs_path: str) -> Dict[s
     """
     Reconstruye el texto completo de artículos o disposiciones usando sus metadatos.
     Devuelve un diccionario con id, título y texto completo.
+    Un párrafo que falta dentro del rango cuenta como texto vacío (deja un
+    separador de más), y los elementos sin párrafos se mantienen con texto vacío.
     """
     metadata = load_json(metadata_path)
     paragraphs = load_json(paragraphs_path)
@@ -35,17 +46,21 @@ def reconstruct_complex_text(metadata_path: str, paragraphs_path: str) -> Dict[s
     if not metadata or not paragraphs:
         return reconstructed
 
+    text_store = CorpusTextStore(paragraphs, {"items": metadata})
     for item_id, data in metadata.items():
         start_para = data.get('begin')
         end_para = data.get('end')
-        title = data.get('title', '')
         
         if start_para is not None and end_para is not None:
-            # Concatenar los párrafos correspondientes al rango
-            text_parts = [paragraphs.get(str(i), '') for i in range(start_para, end_para + 1)]
-            full_text = ' '.join(text_parts).strip()
+            if text_store.block_size("items", item_id) == end_para - start_para + 1:
+                # Rango completo: un único fragmento del buffer con todos los párrafos
+                full_text = text_store.block_text("items", item_id, separator=' ').strip()
+            else:
+                # Rango vacío o con huecos: cada párrafo que falta aporta un texto vacío
+                text_parts = [paragraphs.get(str(i), '') for i in range(start_para, end_para + 1)]
+                full_text = ' '.join(text_parts).strip()
             reconstructed[item_id] = {
-                'title': title, 
+                'title': data.get('title', ''), 
                 'text': full_text,
                 'begin': start_para,
                 'end': end_para
@@ -73,8 +88,6 @@ def normalize_text(text: str) -> str:
     """Normaliza el texto para comparaciones exactas (minúsculas y sin espacios extra)."""
     return ' '.join(text.lower().split())
 
-import json
-
 def load_and_structure_data(base_path: str) -> Dict[str, Dict]:
     """
     Carga los datos desde articles.json y paragraphs.json y los combina
@@ -89,14 +102,10 @@ def load_and_structure_data(base_path: str) -> Dict[str, Dict]:
                          y el valor contiene su título, texto completo y un
                          diccionario anidado de sus párrafos.
     """
-    articles_path = os.path.join(base_path, 'articles.json')
-    paragraphs_path = os.path.join(base_path, 'paragraphs.json')
-
     try:
-        with open(articles_path, 'r', encoding='utf-8') as f:
+        text_store = CorpusTextStore.from_directory(base_path)
+        with open(os.path.join(base_path, 'articles.json'), 'r', encoding='utf-8') as f:
             articles_data = json.load(f)
-        with open(paragraphs_path, 'r', encoding='utf-8') as f:
-            paragraphs_data = json.load(f)
     except FileNotFoundError as e:
         print(f"Error: No se encontró el archivo {e.filename}. Verifica las rutas.")
         return {}
@@ -106,27 +115,13 @@ def load_and_structure_data(base_path: str) -> Dict[str, Dict]:
     
     for article_id, article_info in tqdm(articles_data.items(), desc="Procesando artículos"):
         # Asegurarse de que el artículo tiene un rango de párrafos definido
-        if 'begin' not in article_info or 'end' not in article_info:
+        if not text_store.has_block("articles", article_id):
             continue
 
-        begin = article_info['begin']
-        end = article_info['end']
-        
-        article_paragraphs = {}
-        full_text_list = []
-        
-        # Recorrer el rango de párrafos para este artículo
-        for para_num in range(begin, end + 1):
-            para_id = str(para_num)
-            if para_id in paragraphs_data:
-                paragraph_text = paragraphs_data[para_id]
-                article_paragraphs[para_id] = paragraph_text
-                full_text_list.append(paragraph_text)
-        
         structured_data[article_id] = {
             'title': article_info.get('title', f'Artículo {article_id}'),
-            'paragraphs': article_paragraphs,
-            'full_text': " ".join(full_text_list)
+            'paragraphs': dict(text_store.block_paragraphs("articles", article_id)),
+            'full_text': text_store.block_text("articles", article_id, separator=' ')
         }
         
-    return structured_data
\ No newline at end of file
+    return structured_data